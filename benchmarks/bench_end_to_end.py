@@ -0,0 +1,178 @@
+"""
+端到端基准：启动 mock_server.py，在临时目录中用 bucket_tool.py 完整列举并下载若干存储桶，
+输出耗时、对象数/秒、MB/秒、工具进程的峰值 RSS，以及服务端收到的各类请求数。
+工具通过 -p 把服务端当作 HTTP 代理访问 http://<bucket>.<域名>，不需要配置 DNS。
+
+用法：python benchmarks/bench_end_to_end.py --dialect oss --buckets 4 --objects 5000 --sizes 4K,256K -- -t 16 -l 4
+"--" 之后的参数原样传给 bucket_tool.py；--shards N 同时运行 N 个 --shard 进程；--json 把结果追加到文件中，便于比较不同版本。
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.request
+import zipfile
+
+from mock_server import add_server_arguments
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# 方言 -> (模块, 存储桶域名, 服务端列举格式)；域名中含有模块校验需要的关键字
+DIALECTS = {
+    "s3": ("s3", "s3-bench.test", "s3"),
+    "oss": ("ali", "oss-bench.test", "s3"),
+    "cos": ("tx", "cos-bench.test", "s3"),
+    "obs": ("hw", "obs-bench.test", "obs"),
+    "azure": ("abs", "blob-bench.test", "azure"),
+    "ibm": ("ibm", "ibm-cos-bench.test", "json"),
+}
+
+
+def start_mock(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+               "--dialect", DIALECTS[args.dialect][2], "--objects", str(args.objects), "--sizes", args.sizes,
+               "--latency", str(args.latency), "--rate", str(args.rate), "--fail", str(args.fail),
+               "--reset", str(args.reset), "--corrupt", str(args.corrupt), "--slow", str(args.slow)]
+    if args.retry_after is not None:
+        command += ["--retry-after", str(args.retry_after)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    port = int(server.stdout.readline())
+    return server, port
+
+
+def server_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats") as response:
+        return json.load(response)
+
+
+def downloaded(directory, requests):
+    """统计输出的对象数和字节数：./downloads 下的文件、--sink tar/zip 的归档条目，以及 --sink minio 上传的对象。"""
+    count = size = 0
+    for root, _, files in os.walk(os.path.join(directory, "downloads")):
+        for name in files:
+            count += 1
+            size += os.path.getsize(os.path.join(root, name))
+    if os.path.exists(os.path.join(directory, "downloads.tar")):
+        with tarfile.open(os.path.join(directory, "downloads.tar")) as archive:
+            members = [member for member in archive if member.isfile()]
+        count += len(members)
+        size += sum(member.size for member in members)
+    if os.path.exists(os.path.join(directory, "downloads.zip")):
+        with zipfile.ZipFile(os.path.join(directory, "downloads.zip")) as archive:
+            members = archive.infolist()
+        count += len(members)
+        size += sum(member.file_size for member in members)
+    return count + requests["put_objects"], size + requests["put_bytes"]
+
+
+def run_tool(workdir, module, url_file, port, extra, shards=1):
+    """
+    运行工具并返回 (耗时, 峰值 RSS 字节数, 退出码)。shards 大于 1 时同时启动 shards 个 --shard i/N 进程，
+    全部结束后再用 --merge-shards 合并日志；耗时为整体耗时，峰值 RSS 为各进程中的最大值。
+    """
+    # 参数中的 {mock} 替换为模拟服务的地址，例如 --sink minio --output {mock}/backup
+    command = [sys.executable, os.path.join(ROOT, "bucket_tool.py"), "-m", module, "-f", url_file,
+               "-p", f"http://127.0.0.1:{port}"] + [arg.replace("{mock}", f"http://127.0.0.1:{port}") for arg in extra]
+    commands = [command] if shards == 1 else [command + ["--shard", f"{i}/{shards}"] for i in range(1, shards + 1)]
+    logs = [open(os.path.join(workdir, "tool.log" if shards == 1 else f"tool-{i}.log"), "w")
+            for i in range(1, len(commands) + 1)]
+    try:
+        started = time.perf_counter()
+        processes = [subprocess.Popen(command, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+                     for command, log in zip(commands, logs)]
+        peak_rss = returncode = 0
+        for process in processes:
+            _, status, usage = os.wait4(process.pid, 0)
+            # Linux 上 ru_maxrss 以 KB 为单位，macOS 上以字节为单位
+            peak_rss = max(peak_rss, usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024)
+            returncode = returncode or os.waitstatus_to_exitcode(status)
+        elapsed = time.perf_counter() - started
+    finally:
+        for log in logs:
+            log.close()
+
+    if shards > 1:
+        with open(os.path.join(workdir, "merge.log"), "w") as log:
+            subprocess.run([sys.executable, os.path.join(ROOT, "bucket_tool.py"), "-m", module, "-f", url_file,
+                            "--merge-shards"], cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    return elapsed, peak_rss, returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against a local mock object storage server",
+                                     usage="%(prog)s [options] [-- bucket_tool options]")
+    parser.add_argument("--dialect", choices=DIALECTS, default="oss", help="Storage dialect to emulate (default: oss)")
+    parser.add_argument("--buckets", type=int, default=1, help="Number of buckets (default: 1)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs to measure, the best one is reported (default: 1)")
+    parser.add_argument("--json", metavar="FILE", help="Append the result as one JSON line to FILE")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Run this many bucket_tool.py processes with --shard i/N side by side (default: 1)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory (downloads, logs)")
+    add_server_arguments(parser)
+    parser.set_defaults(objects=2000)
+    args, extra = parser.parse_known_args()
+    if extra[:1] == ["--"]:
+        extra = extra[1:]
+
+    module, domain, _ = DIALECTS[args.dialect]
+    server, port = start_mock(args)
+    results = []
+    try:
+        for _ in range(args.repeat):
+            workdir = tempfile.mkdtemp(prefix="bucket-bench-")
+            url_file = os.path.join(workdir, "urls.txt")
+            with open(url_file, "w") as f:
+                f.writelines(f"http://bench{i}.{domain}\n" for i in range(args.buckets))
+
+            before = server_stats(port)
+            elapsed, peak_rss, returncode = run_tool(workdir, module, url_file, port, extra, args.shards)
+            after = server_stats(port)
+            requests = {field: after[field] - before[field] for field in after}
+            files, size = downloaded(workdir, requests)
+            results.append({
+                "dialect": args.dialect, "buckets": args.buckets, "objects": args.objects, "sizes": args.sizes,
+                "latency_ms": args.latency, "rate": args.rate, "fail": args.fail, "reset": args.reset,
+                "corrupt": args.corrupt, "slow": args.slow, "shards": args.shards,
+                "tool_args": " ".join(extra), "returncode": returncode, "seconds": round(elapsed, 3),
+                "files": files, "bytes": size, "objects_per_second": round(files / elapsed, 1),
+                "mb_per_second": round(size / elapsed / (1024 * 1024), 2), "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+                "requests": requests,
+            })
+            if args.keep:
+                print(f"Working directory: {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+    best = min(results, key=lambda result: result["seconds"])
+    expected = args.buckets * args.objects
+    requests = best["requests"]
+    print(f"dialect={args.dialect} buckets={args.buckets} objects={args.objects} sizes={args.sizes} "
+          f"latency={args.latency}ms rate={args.rate or '-'} fail={args.fail} reset={args.reset} shards={args.shards} "
+          f"args='{best['tool_args']}'")
+    print(f"  time        {best['seconds']:.2f} s (best of {len(results)})")
+    print(f"  files       {best['files']} of {expected}" + ("" if best["files"] == expected else "  (INCOMPLETE)"))
+    print(f"  throughput  {best['objects_per_second']:.1f} objects/s, {best['mb_per_second']:.2f} MB/s")
+    print(f"  peak RSS    {best['peak_rss_mb']:.1f} MB")
+    print(f"  requests    list={requests['list']} get={requests['get']} range={requests['range']} "
+          f"throttled={requests['throttled']} failed={requests['failed']} reset={requests['reset']}"
+          + (f" corrupt={requests['corrupt']}" if requests["corrupt"] else "")
+          + (f" slow={requests['slow']}" if requests["slow"] else "")
+          + (f" put={requests['put']}" if requests["put"] else ""))
+    if best["returncode"]:
+        print(f"  bucket_tool exited with {best['returncode']}")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps(best) + "\n")
+
+
+if __name__ == "__main__":
+    main()
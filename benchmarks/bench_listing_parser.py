@@ -0,0 +1,144 @@
+"""
+列举响应解析的微基准：对比之前各处理器中的解析、共用的 parse_listing，以及不构建整棵树的事件流解析（iterparse）。
+事件流解析每个元素都要回到 Python 处理一次，1000 个对象的一页明显慢于 C 实现的一次建树，所以 parse_listing 没有采用。
+
+用法：python benchmarks/bench_listing_parser.py [-k 每页对象数] [-n 重复次数]
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.handlers.base import ListPage, ObjectInfo, normalize_etag  # noqa: E402
+from src.handlers.xml_listing import AZURE_LISTING, S3_LISTING, parse_listing  # noqa: E402
+
+OBS_NS = "http://obs.myhwclouds.com/doc/2015-06-30/"
+
+
+def s3_page(count, namespace=None):
+    xmlns = f' xmlns="{namespace}"' if namespace else ""
+    parts = [f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult{xmlns}><Name>bucket</Name><Prefix></Prefix>'
+             f'<MaxKeys>{count}</MaxKeys><IsTruncated>true</IsTruncated><NextMarker>dir/file{count - 1:07d}.bin</NextMarker>']
+    for i in range(count):
+        parts.append(f'<Contents><Key>dir/file{i:07d}.bin</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified>'
+                     f'<ETag>"5eb63bbbe01eeed093cb22bb8f5acdc3"</ETag><Size>{i * 37}</Size>'
+                     f'<Owner><ID>1234</ID><DisplayName>owner</DisplayName></Owner>'
+                     f'<StorageClass>STANDARD</StorageClass></Contents>')
+    parts.append('<CommonPrefixes><Prefix>logs/</Prefix></CommonPrefixes></ListBucketResult>')
+    return "".join(parts).encode()
+
+
+def azure_page(count):
+    parts = ['<?xml version="1.0" encoding="utf-8"?><EnumerationResults ContainerName="https://a.blob.core.windows.net/c">'
+             '<Blobs>']
+    for i in range(count):
+        parts.append(f'<Blob><Name>dir/file{i:07d}.bin</Name><Properties>'
+                     f'<Last-Modified>Mon, 01 Jan 2024 00:00:00 GMT</Last-Modified><Etag>0x8D9A1B2C3D4E5F6</Etag>'
+                     f'<Content-Length>{i * 37}</Content-Length><Content-Type>application/octet-stream</Content-Type>'
+                     f'<BlobType>BlockBlob</BlobType><AccessTier>Hot</AccessTier></Properties></Blob>')
+    parts.append('<BlobPrefix><Name>logs/</Name></BlobPrefix></Blobs><NextMarker>2!96!MDAwMDE</NextMarker>'
+                 '</EnumerationResults>')
+    return "".join(parts).encode()
+
+
+# 之前各处理器中的 ElementTree 解析，作为对照
+def etree_s3(xml_content):
+    keys = []
+    root = ET.fromstring(xml_content)
+    for contents in root.findall("Contents"):
+        key_element = contents.find("Key")
+        size_element = contents.find("Size")
+        if key_element is not None and size_element is not None:
+            keys.append(ObjectInfo(key_element.text, int(size_element.text), normalize_etag(contents.findtext("ETag")),
+                                   contents.findtext("LastModified"), contents.findtext("StorageClass")))
+    prefixes = [element.text for element in root.findall("CommonPrefixes/Prefix")]
+    is_truncated_element = root.find("IsTruncated")
+    is_truncated = is_truncated_element is not None and is_truncated_element.text == 'true'
+    next_marker_element = root.find("NextMarker")
+    next_marker = next_marker_element.text if is_truncated and next_marker_element is not None else None
+    return ListPage(keys, prefixes, next_marker)
+
+
+def etree_obs(xml_content):
+    ns = "{" + OBS_NS + "}"
+    keys = []
+    root = ET.fromstring(xml_content)
+    for contents in root.findall(ns + "Contents"):
+        keys.append(ObjectInfo(contents.find(ns + "Key").text, int(contents.find(ns + "Size").text),
+                               normalize_etag(contents.findtext(ns + "ETag")), contents.findtext(ns + "LastModified"),
+                               contents.findtext(ns + "StorageClass")))
+    prefixes = [element.text for element in root.findall(ns + "CommonPrefixes/" + ns + "Prefix")]
+    is_truncated = root.find(ns + "IsTruncated").text == 'true'
+    next_marker = root.find(ns + "NextMarker").text if is_truncated else None
+    return ListPage(keys, prefixes, next_marker)
+
+
+def etree_azure(xml_content):
+    keys = []
+    root = ET.fromstring(xml_content)
+    for blob in root.findall(".//{*}Blob"):
+        keys.append(ObjectInfo(blob.find("{*}Name").text, int(blob.find("{*}Properties/{*}Content-Length").text),
+                               normalize_etag(blob.findtext("{*}Properties/{*}Etag")),
+                               blob.findtext("{*}Properties/{*}Last-Modified"),
+                               blob.findtext("{*}Properties/{*}AccessTier")))
+    prefixes = [element.text for element in root.findall(".//{*}BlobPrefix/{*}Name")]
+    next_marker = root.find(".//{*}NextMarker")
+    return ListPage(keys, prefixes, next_marker.text if next_marker is not None and next_marker.text else None)
+
+
+# 事件流解析：只在对象元素结束时取出字段，随后清空该元素
+def iterparse_listing(xml_content, record, fields, prefix_group, prefix):
+    keys, prefixes, top = [], [], {}
+    key_field, size_field, etag_field, last_modified_field, storage_class_field = fields
+    for _, element in ET.iterparse(io.BytesIO(xml_content)):
+        tag = element.tag.rpartition("}")[2]
+        if tag == record:
+            values = {child.tag.rpartition("}")[2]: child.text for child in element.iter()}
+            keys.append(ObjectInfo(values[key_field], int(values[size_field]), normalize_etag(values.get(etag_field)),
+                                   values.get(last_modified_field), values.get(storage_class_field)))
+            element.clear()
+        elif tag == prefix_group:
+            prefixes.extend(child.text for child in element if child.tag.rpartition("}")[2] == prefix)
+            element.clear()
+        else:
+            top[tag] = element.text
+    next_marker = top.get("NextMarker") if top.get("IsTruncated", "true") == "true" else None
+    return ListPage(keys, prefixes, next_marker or None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Listing parser microbenchmark")
+    parser.add_argument("-k", "--keys", type=int, default=1000, help="Objects per page (default: 1000)")
+    parser.add_argument("-n", "--number", type=int, default=200, help="Pages parsed per measurement (default: 200)")
+    args = parser.parse_args()
+
+    s3_fields = (("Key", "Size", "ETag", "LastModified", "StorageClass"), "CommonPrefixes", "Prefix")
+    azure_fields = (("Name", "Content-Length", "Etag", "Last-Modified", "AccessTier"), "BlobPrefix", "Name")
+    cases = [
+        ("S3/OSS/COS", s3_page(args.keys), etree_s3, S3_LISTING, ("Contents",) + s3_fields),
+        ("OBS (namespaced)", s3_page(args.keys, OBS_NS), etree_obs, S3_LISTING, ("Contents",) + s3_fields),
+        ("Azure", azure_page(args.keys), etree_azure, AZURE_LISTING, ("Blob",) + azure_fields),
+    ]
+
+    def measure(parse):
+        return min(timeit.repeat(parse, number=args.number, repeat=3)) / args.number * 1000
+
+    print(f"{'format':<18}{'previous':>12}{'parse_listing':>16}{'iterparse':>12}   ({args.keys} keys/page)")
+    for name, page, previous, schema, events in cases:
+        # 三种解析结果必须一致
+        expected = previous(page)
+        assert parse_listing(page, schema) == expected, name
+        assert iterparse_listing(page, *events) == expected, name
+
+        old = measure(lambda: previous(page))
+        new = measure(lambda: parse_listing(page, schema))
+        streamed = measure(lambda: iterparse_listing(page, *events))
+        print(f"{name:<18}{old:>9.2f} ms{new:>13.2f} ms{streamed:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+启动耗时基准：在新的解释器中导入工具启动时用到的模块并解析指定模块的处理器，多次运行取中位数，
+同时检查不该在启动时加载的重量级依赖（boto3/botocore、tqdm、httpx）是否被导入。
+--check 时只要加载了其中任何一个就以非零状态退出，可作为回归检查。
+
+用法：python benchmarks/bench_startup.py [-m ali] [-n 20] [--check]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+HEAVY = ("boto3", "botocore", "tqdm", "httpx")
+
+# 子进程中执行：导入 bucket_tool 的启动路径并取得处理器类，输出导入耗时和已加载的重量级模块
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import bucket_tool
+from src.handlers import BucketFactory
+# 旧版本没有 get_handler_class，处理器在导入时已全部加载
+getattr(BucketFactory, "get_handler_class", BucketFactory.HANDLERS.get)({module!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed,
+                  "heavy": sorted(name for name in {heavy!r} if name in sys.modules)}}))
+"""
+
+
+def probe(module):
+    """返回 (进程总耗时, 导入耗时, 已加载的重量级模块)。"""
+    command = [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)]
+    started = time.perf_counter()
+    output = subprocess.run(command, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - started
+    result = json.loads(output.splitlines()[-1])
+    return total, result["seconds"], result["heavy"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure interpreter startup and import time of bucket_tool")
+    parser.add_argument("-m", "--module", default="ali", help="Handler module to resolve (default: ali)")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Number of fresh interpreters (default: 20)")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if a heavy dependency is imported at startup")
+    args = parser.parse_args()
+
+    probe(args.module)  # 预热文件系统缓存和 .pyc
+    totals, imports, heavy = [], [], set()
+    for _ in range(args.runs):
+        total, seconds, loaded = probe(args.module)
+        totals.append(total)
+        imports.append(seconds)
+        heavy.update(loaded)
+
+    print(f"module={args.module} runs={args.runs}")
+    print(f"  process     median {statistics.median(totals) * 1000:.1f} ms, min {min(totals) * 1000:.1f} ms")
+    print(f"  imports     median {statistics.median(imports) * 1000:.1f} ms, min {min(imports) * 1000:.1f} ms")
+    print(f"  heavy deps  {', '.join(sorted(heavy)) or 'none'}")
+    if args.check and heavy:
+        print(f"  unexpected imports at startup: {', '.join(sorted(heavy))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
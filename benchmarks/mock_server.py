@@ -0,0 +1,352 @@
+"""
+离线基准用的模拟对象存储服务，任意存储桶名都可以访问，每个存储桶都有同样的一组对象。
+支持处理器使用的几种列举格式：OSS/COS 的 ListBucketResult、带命名空间的 OBS、Azure 的 EnumerationResults
+以及 IBM 风格的 JSON；支持 prefix/marker/delimiter/max-keys、ListObjectsV2 的 continuation-token 和 Range 下载。
+可以设置每个请求的延迟、全局请求速率（超出时返回 503 SlowDown）、随机 500 错误和下载中途断开连接。
+
+同时充当 HTTP 代理：工具以 -p http://127.0.0.1:<port> 访问 http://<bucket>.oss.bench.test 这样的地址时，
+请求行中是完整 URL，不需要配置 DNS。PUT 只做计数，可以作为 --sink minio 的目标。GET /__stats 返回各类请求的计数（JSON）。
+
+用法：python benchmarks/mock_server.py --dialect s3 --objects 10000 --sizes 4K,1M --latency 20
+"""
+import argparse
+import base64
+import bisect
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import tarfile
+import threading
+import time
+import urllib.parse
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+DIALECTS = ("s3", "obs", "azure", "json")
+OBS_NS = "http://obs.myhwclouds.com/doc/2015-06-30/"
+LAST_MODIFIED = 1704067200  # 2024-01-01T00:00:00Z
+
+# --slow 的慢速连接：每 SLOW_CHUNK 字节停顿一次，速率为 SLOW_RATE 字节/秒
+SLOW_CHUNK = 64 * 1024
+SLOW_RATE = 1024 * 1024
+
+
+def parse_size(value):
+    match = re.fullmatch(r"(\d+)([KMG]?)", value.strip().upper())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"invalid size: {value}")
+    return int(match.group(1)) * {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[match.group(2)]
+
+
+class Store:
+    """所有存储桶共用的对象集合：键名有序，大小按 sizes 轮流取值，内容只取决于大小（ETag 是真实的 MD5）。"""
+
+    def __init__(self, objects, sizes, seed=0):
+        self.keys = sorted(f"dir{i % 10}/sub{i % 7}/object{i:08d}.bin" for i in range(objects))
+        self.sizes = {key: sizes[i % len(sizes)] for i, key in enumerate(self.keys)}
+        self.data = random.Random(seed).randbytes(max(sizes)) if sizes else b""
+        self.etags = {size: hashlib.md5(self.data[:size]).hexdigest() for size in set(sizes)}
+
+    def page(self, prefix, marker, delimiter, max_keys):
+        """返回 (对象键列表, 公共前缀列表, 是否截断)，语义与 S3 ListObjects 相同。"""
+        keys = self.keys
+        i = bisect.bisect_left(keys, prefix)
+        if marker:
+            i = max(i, bisect.bisect_right(keys, marker))
+        contents, prefixes, last = [], [], None
+        while i < len(keys) and keys[i].startswith(prefix):
+            if len(contents) + len(prefixes) >= max_keys:
+                return contents, prefixes, True
+            key = keys[i]
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest[:rest.index(delimiter) + len(delimiter)]
+                if not (marker and marker.startswith(common)) and common != last:
+                    prefixes.append(common)
+                    last = common
+                # 跳过这个公共前缀下的其余键
+                i = bisect.bisect_left(keys, common[:-1] + chr(ord(common[-1]) + 1))
+                continue
+            contents.append(key)
+            i += 1
+        return contents, prefixes, False
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"list": 0, "get": 0, "range": 0, "head": 0, "throttled": 0, "failed": 0, "reset": 0,
+                       "corrupt": 0, "slow": 0, "bytes": 0,
+                       "put": 0, "put_objects": 0, "put_bytes": 0}
+
+    def add(self, field, value=1):
+        with self.lock:
+            self.counts[field] += value
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class RateLimiter:
+    """令牌桶：每秒补充 rate 个令牌，取不到时请求被限流。"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def render_listing(dialect, prefix, marker, contents, prefixes, truncated, store, v2=False):
+    if dialect == "json":
+        return "application/json", json.dumps({
+            "Contents": [{"Key": key, "Size": store.sizes[key], "ETag": f'"{store.etags[store.sizes[key]]}"',
+                          "LastModified": "2024-01-01T00:00:00.000Z", "StorageClass": "STANDARD"} for key in contents],
+            "CommonPrefixes": [{"Prefix": common} for common in prefixes],
+        }).encode()
+
+    if dialect == "azure":
+        next_marker = ""
+        if truncated:
+            last = max(contents[-1:] + prefixes[-1:])
+            next_marker = base64.urlsafe_b64encode(last.encode()).decode()
+        parts = ['<?xml version="1.0" encoding="utf-8"?><EnumerationResults ContainerName="bench">'
+                 f'<Prefix>{escape(prefix)}</Prefix><Blobs>']
+        modified = formatdate(LAST_MODIFIED, usegmt=True)
+        for key in contents:
+            size = store.sizes[key]
+            parts.append(f'<Blob><Name>{escape(key)}</Name><Properties><Last-Modified>{modified}</Last-Modified>'
+                         f'<Etag>0x8D{store.etags[size][:13].upper()}</Etag><Content-Length>{size}</Content-Length>'
+                         f'<BlobType>BlockBlob</BlobType><AccessTier>Hot</AccessTier></Properties></Blob>')
+        parts.extend(f'<BlobPrefix><Name>{escape(common)}</Name></BlobPrefix>' for common in prefixes)
+        parts.append(f'</Blobs><NextMarker>{next_marker}</NextMarker></EnumerationResults>')
+        return "application/xml", "".join(parts).encode()
+
+    xmlns = f' xmlns="{OBS_NS}"' if dialect == "obs" else ""
+    parts = [f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult{xmlns}><Name>bench</Name>'
+             f'<Prefix>{escape(prefix)}</Prefix><Marker>{escape(marker)}</Marker><MaxKeys>1000</MaxKeys>'
+             f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>']
+    if truncated and v2:
+        token = base64.urlsafe_b64encode(max(contents[-1:] + prefixes[-1:]).encode()).decode()
+        parts.append(f'<KeyCount>{len(contents) + len(prefixes)}</KeyCount><NextContinuationToken>{token}'
+                     f'</NextContinuationToken>')
+    elif truncated:
+        parts.append(f'<NextMarker>{escape(max(contents[-1:] + prefixes[-1:]))}</NextMarker>')
+    for key in contents:
+        size = store.sizes[key]
+        parts.append(f'<Contents><Key>{escape(key)}</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified>'
+                     f'<ETag>"{store.etags[size]}"</ETag><Size>{size}</Size>'
+                     f'<StorageClass>STANDARD</StorageClass></Contents>')
+    parts.extend(f'<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>' for common in prefixes)
+    parts.append('</ListBucketResult>')
+    return "application/xml", "".join(parts).encode()
+
+
+def make_handler(config, store, stats, limiter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, status, body, content_type="application/octet-stream", headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_error_body(self, status, code, headers=()):
+            self.send_body(status, f"<Error><Code>{code}</Code></Error>".encode(), "application/xml", headers)
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            if url.path == "/__stats":
+                self.send_body(200, json.dumps(stats.snapshot()).encode(), "application/json")
+                return
+
+            if config.latency:
+                time.sleep(config.latency / 1000)
+            if limiter is not None and not limiter.acquire():
+                stats.add("throttled")
+                headers = [("Retry-After", str(config.retry_after))] if config.retry_after is not None else []
+                self.send_error_body(503, "SlowDown", headers)
+                return
+            if config.fail and random.random() < config.fail:
+                stats.add("failed")
+                self.send_error_body(500, "InternalError")
+                return
+
+            query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+            key = urllib.parse.unquote(url.path.lstrip("/"))
+            if not key:
+                self.list_objects(query)
+            else:
+                self.get_object(key)
+
+        def do_HEAD(self):
+            key = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path.lstrip("/"))
+            size = store.sizes.get(key)
+            if size is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            stats.add("head")
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            for name, value in self.object_headers(size):
+                self.send_header(name, value)
+            self.end_headers()
+
+        def object_headers(self, size):
+            """Azure 的 ETag 是版本号，内容 MD5 放在 Content-MD5 中；其他服务的 ETag 就是 MD5。"""
+            if config.dialect == "azure":
+                return [("ETag", f'"0x8D{store.etags[size][:13].upper()}"'),
+                        ("Content-MD5", base64.b64encode(bytes.fromhex(store.etags[size])).decode())]
+            return [("ETag", f'"{store.etags[size]}"')]
+
+        def do_PUT(self):
+            """充当 --sink minio 的目标：只统计上传，不保存内容；snowball 批量上传按其中的 tar 条目计数。"""
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            objects = 1
+            if self.headers.get("X-Amz-Meta-Snowball-Auto-Extract") == "true":
+                with tarfile.open(fileobj=io.BytesIO(body)) as archive:
+                    objects = sum(1 for member in archive if member.isfile())
+            stats.add("put")
+            stats.add("put_objects", objects)
+            stats.add("put_bytes", len(body))
+            self.send_body(200, b"", headers=[("ETag", f'"{hashlib.md5(body).hexdigest()}"')])
+
+        def list_objects(self, query):
+            stats.add("list")
+            prefix = query.get("prefix", "")
+            marker = query.get("marker", "")
+            if config.dialect == "azure" and marker:
+                marker = base64.urlsafe_b64decode(marker.encode()).decode()
+            v2 = query.get("list-type") == "2"
+            if v2:
+                # ListObjectsV2：continuation-token 是不透明令牌，start-after 是对象键
+                token = query.get("continuation-token")
+                marker = base64.urlsafe_b64decode(token.encode()).decode() if token else query.get("start-after", "")
+            max_keys = min(int(query.get("max-keys", query.get("maxresults", 1000))), 1000)
+            contents, prefixes, truncated = store.page(prefix, marker, query.get("delimiter", ""), max_keys)
+            content_type, body = render_listing(config.dialect, prefix, marker, contents, prefixes,
+                                                truncated, store, v2)
+            self.send_body(200, body, content_type)
+
+        def get_object(self, key):
+            size = store.sizes.get(key)
+            if size is None:
+                self.send_error_body(404, "NoSuchKey")
+                return
+
+            start, end, status = 0, size - 1, 200
+            match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if match is not None:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                status = 206
+            stats.add("range" if status == 206 else "get")
+
+            body = memoryview(store.data)[start:end + 1]
+            if config.corrupt and len(body) and random.random() < config.corrupt:
+                # 翻转第一个字节：长度正确但内容错误，只有校验和能发现
+                stats.add("corrupt")
+                body = bytes([body[0] ^ 0xFF]) + body[1:]
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in self.object_headers(size):
+                self.send_header(name, value)
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            if config.reset and len(body) > 1 and random.random() < config.reset:
+                # 只发送一半响应体就断开连接
+                stats.add("reset")
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            if config.slow and status == 200 and len(body) > SLOW_CHUNK and random.random() < config.slow:
+                # 拖尾连接：整个对象按 SLOW_RATE 慢速发送，Range 请求不受影响
+                stats.add("slow")
+                try:
+                    for offset in range(0, len(body), SLOW_CHUNK):
+                        self.wfile.write(body[offset:offset + SLOW_CHUNK])
+                        stats.add("bytes", len(body[offset:offset + SLOW_CHUNK]))
+                        time.sleep(SLOW_CHUNK / SLOW_RATE)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端把剩余部分改为 Range 下载后关闭了这个连接
+                    self.close_connection = True
+                return
+            self.wfile.write(body)
+            stats.add("bytes", len(body))
+
+    return Handler
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--objects", type=int, default=10000, help="Objects per bucket (default: 10000)")
+    parser.add_argument("--sizes", default="4K",
+                        help="Comma-separated object sizes assigned round-robin, e.g. 4K,64K,8M (default: 4K)")
+    parser.add_argument("--latency", type=float, default=0, help="Added latency per request in ms (default: 0)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Requests per second before answering 503 SlowDown, 0 disables (default: 0)")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with 503 responses")
+    parser.add_argument("--fail", type=float, default=0, help="Probability of a 500 response (default: 0)")
+    parser.add_argument("--reset", type=float, default=0,
+                        help="Probability of closing the connection halfway through a body (default: 0)")
+    parser.add_argument("--corrupt", type=float, default=0,
+                        help="Probability of flipping a byte in an object body (default: 0)")
+    parser.add_argument("--slow", type=float, default=0,
+                        help="Probability of streaming a whole-object GET at 1 MB/s, ranges stay fast (default: 0)")
+
+
+def start_server(config, port=0):
+    sizes = [parse_size(size) for size in config.sizes.split(",")]
+    store = Store(config.objects, sizes)
+    stats = Stats()
+    limiter = RateLimiter(config.rate) if config.rate else None
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config, store, stats, limiter))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock object storage server for offline benchmarks")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on, 0 picks a free port (default: 0)")
+    parser.add_argument("--dialect", choices=DIALECTS, default="s3", help="Listing format (default: s3)")
+    add_server_arguments(parser)
+    config = parser.parse_args()
+
+    server = start_server(config, config.port)
+    # 第一行输出实际端口，供基准脚本读取
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
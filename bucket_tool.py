@@ -2,11 +2,11 @@ import logging
 # 忽略 InsecureRequestWarning 警告
 import warnings
 
-import requests
 from urllib3.exceptions import InsecureRequestWarning
 
 from src.utils.bucket_handler import process_buckets
 from src.utils.helpers import read_urls_from_file, configure_logging, handle_sigint, print_logo, parse_arguments
+from src.utils.transport import build_session
 
 warnings.simplefilter('ignore', InsecureRequestWarning)
 
@@ -15,15 +15,7 @@ def main():
 
     try:
         args = parse_arguments()
-        session = requests.Session()
-        if args.proxy:
-            session.proxies = {
-                'http': args.proxy,
-                'https': args.proxy,
-                'socks5': args.proxy
-            }
-            session.trust_env = False  # 忽略系统代理设置
-        session.verify = False
+        session = build_session(args)
 
         bucket_urls = []
         if args.url:
@@ -35,7 +27,7 @@ def main():
             logging.error("No bucket URLs provided. Use -u or -f to specify URLs.")
             return
 
-        process_buckets(bucket_urls, args.module, session, args.threads)
+        process_buckets(bucket_urls, session, args)
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
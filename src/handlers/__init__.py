@@ -1,32 +1,34 @@
+import importlib
+
 import requests
-from .aliyun_oss import AliyunOSSHandler
-from .huawei_obs import HuaweiOBSHandler
-from .tencent_cos import TencentCOSHandler
-from .amazon_s3 import AmazonS3Handler
-from .backblaze_b2 import BackblazeB2Handler
-from .digitalocean_spaces import DigitalOceanSpacesHandler
-from .google_gcs import GoogleGCSHandler
-from .ibm_cos import IBMCloudObjectStorageHandler
-from .microsoft_abs import MicrosoftAzureBlobStorageHandler
-from .oracle_ocs import OracleCloudStorageHandler
+
 
 class BucketFactory:
+    # 模块名 -> (处理器所在模块, 类名)；处理器在第一次使用时才导入，启动时不必加载全部处理器及其依赖
     HANDLERS = {
-        "ali": AliyunOSSHandler,
-        "hw": HuaweiOBSHandler,
-        "tx": TencentCOSHandler,
-        "s3": AmazonS3Handler,
-        "b2": BackblazeB2Handler,
-        "do": DigitalOceanSpacesHandler,
-        "gcs": GoogleGCSHandler,
-        "ibm": IBMCloudObjectStorageHandler,
-        "abs": MicrosoftAzureBlobStorageHandler,
-        "oci": OracleCloudStorageHandler,
+        "ali": ("src.handlers.aliyun_oss", "AliyunOSSHandler"),
+        "hw": ("src.handlers.huawei_obs", "HuaweiOBSHandler"),
+        "tx": ("src.handlers.tencent_cos", "TencentCOSHandler"),
+        "s3": ("src.handlers.amazon_s3", "AmazonS3Handler"),
+        "b2": ("src.handlers.backblaze_b2", "BackblazeB2Handler"),
+        "do": ("src.handlers.digitalocean_spaces", "DigitalOceanSpacesHandler"),
+        "gcs": ("src.handlers.google_gcs", "GoogleGCSHandler"),
+        "ibm": ("src.handlers.ibm_cos", "IBMCloudObjectStorageHandler"),
+        "abs": ("src.handlers.microsoft_abs", "MicrosoftAzureBlobStorageHandler"),
+        "oci": ("src.handlers.oracle_ocs", "OracleCloudStorageHandler"),
     }
 
+    @staticmethod
+    def get_handler_class(module: str):
+        entry = BucketFactory.HANDLERS.get(module)
+        if entry is None:
+            return None
+        module_path, class_name = entry
+        return getattr(importlib.import_module(module_path), class_name)
+
     @staticmethod
     def get_handler(bucket_url: str, session: requests.Session, module: str):
-        handler_class = BucketFactory.HANDLERS.get(module)
+        handler_class = BucketFactory.get_handler_class(module)
         return handler_class(bucket_url, session) if handler_class else None
 
     @staticmethod
@@ -1,14 +1,228 @@
 import logging
+import time
+import urllib.parse
 from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+import requests
+
+from src.handlers.listing import ListingError, PartitionedLister
+from src.utils.checksum import ChecksumMismatch, start_digest
+from src.utils.metrics import RequestTrace
+from src.utils.retry import RETRYABLE_ERRORS, RETRYABLE_STATUS, RetryPolicy, request_with_retry, retry_after_seconds
+from src.utils.stream import DEFAULT_BUFFER_SIZE, open_local, write_stream
+
+
+# 自行重试整个对象（或分段）的请求只发一次，重试只在调用方这一层进行
+SINGLE_ATTEMPT = RetryPolicy(retries=0)
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    storage_class: Optional[str] = None
+
+
+def normalize_etag(etag):
+    """去掉 ETag 两侧的引号，便于比较。"""
+    return etag.strip('"') if etag else None
+
+
+class ListPage(NamedTuple):
+    keys: list  # [ObjectInfo, ...]
+    prefixes: list  # 使用 delimiter 时返回的公共前缀
+    next_marker: Optional[str]
+
 
 class BucketHandler(ABC):
+    # marker 是否就是对象键（可以从任意键之后开始列举），决定能否按字典序区间切分
+    marker_is_key = True
+    # 列举接口是否支持 delimiter 返回公共前缀
+    supports_delimiter = True
+    # 响应头是否带整个对象的 CRC64（OSS、COS），--verify 时与 MD5 在同一遍读取中计算
+    crc64_header = False
+    # 列举请求失败的次数，非零时说明列举结果可能不完整
+    list_errors = 0
+    # 下载读缓冲区大小，以及是否按列举大小预分配文件
+    buffer_size = DEFAULT_BUFFER_SIZE
+    preallocate = False
+    # 打开对象写入目标的函数：默认写本地文件，--sink 为 tar/zip/minio 时由输出目标提供
+    open_output = staticmethod(open_local)
+    # 重试策略，以及所在端点的 AIMD 并发上限（由调度器设置，用于反馈限流情况）
+    retry_policy = RetryPolicy()
+    throttle = None
+    # 请求级指标（--metrics / --metrics-port），以及记录时使用的 (存储桶, 端点) 标签
+    metrics = None
+    metric_labels = ("", "")
+
     @abstractmethod
-    def list_objects(self, prefix=None, marker=None):
+    def _list_request(self, prefix=None, marker=None, delimiter=None):
+        """返回一页列举请求的 (url, params)。"""
         pass
 
     @abstractmethod
-    def download_object(self, key, local_path):
+    def _parse_listing(self, response) -> ListPage:
         pass
 
+    def _request_headers(self):
+        return None
+
+    def object_url(self, key):
+        return f"{self.bucket_url}/{urllib.parse.quote(key)}"
+
+    def set_retry_options(self, retry_policy, throttle=None):
+        self.retry_policy = retry_policy
+        self.throttle = throttle
+
+    def set_metrics(self, metrics, bucket, endpoint):
+        self.metrics = metrics
+        self.metric_labels = (bucket, endpoint)
+
+    def _trace(self, kind):
+        """开始记录一次请求（含重试）的各阶段耗时；未启用指标时不记录。"""
+        return RequestTrace(self.metrics, kind, self.metric_labels)
+
+    def _get(self, url, trace=None, **kwargs):
+        """按重试策略发送 GET，限流和正常响应反馈给所在端点的并发上限。"""
+        return request_with_retry(self.session.get, url, self.retry_policy, self.throttle, trace, **kwargs)
+
+    def _get_once(self, url, trace=None, **kwargs):
+        """只发送一次 GET，限流和正常响应同样反馈给端点的并发上限；由调用方按重试策略重试。"""
+        return request_with_retry(self.session.get, url, SINGLE_ATTEMPT, self.throttle, trace, **kwargs)
+
+    def list_page(self, prefix=None, marker=None, delimiter=None) -> ListPage:
+        """
+        请求并解析一页列举结果。限流、5xx 和网络错误会从同一个 marker 重试；
+        重试用尽后记录日志并抛出 ListingError，游标停在最后一页成功处，不会把列举误当作已完成。
+        """
+        url, params = self._list_request(prefix, marker, delimiter)
+        with self._trace("list") as trace:
+            try:
+                response = self._get(url, trace, params=params, headers=self._request_headers(), timeout=10)
+            except RETRYABLE_ERRORS as e:
+                self._log_error("Listing objects", url, e)
+                self.list_errors += 1
+                raise ListingError(url, e) from e
+            trace.read(len(response.content))
+        if response.status_code != 200:
+            self._log_error("Listing objects", url, response.status_code)
+            self.list_errors += 1
+            raise ListingError(url, response.status_code)
+        return self._parse_listing(response)
+
+    def list_objects(self, prefix=None, marker=None, cursors=None, partition=""):
+        """
+        按页生成 [ObjectInfo, ...]，每请求一页就产出一页，便于边列举边下载。
+        传入 cursors（如 Manifest）时从保存的游标继续，并在调用方处理完一页后再保存下一页的游标。
+        """
+        if cursors is not None:
+            saved = cursors.cursor(partition)
+            if saved is not None:
+                marker, done = saved
+                if done:
+                    return
+
+        while True:
+            page = self.list_page(prefix, marker)
+            yield page.keys
+
+            # 如果没有下一页，则退出循环
+            marker = page.next_marker
+            if cursors is not None:
+                cursors.save_cursor(partition, marker)
+            if marker is None:
+                break
+
+    def list_objects_parallel(self, workers, prefix=None, cursors=None, shard=None):
+        """
+        按公共前缀或字典序区间切分键空间，用 workers 个线程并发列举，合并为一个分页流。
+        传入 shard 时只列举和产出本分片的部分；即使 workers 为 1 也按分区列举，使各分片对分区的划分一致。
+        """
+        if workers <= 1 and shard is None:
+            yield from self.list_objects(prefix, cursors=cursors)
+            return
+
+        yield from PartitionedLister(self, max(workers, 1), cursors=cursors, shard=shard).run(prefix or "")
+
+    def set_download_options(self, buffer_size=DEFAULT_BUFFER_SIZE, preallocate=False, sink=None):
+        self.buffer_size = buffer_size
+        self.preallocate = preallocate
+        if sink is not None:
+            self.open_output = sink.open
+
+    def download_object(self, key, local_path, size=None, transfer=None):
+        """
+        所有处理器共用的下载流程：一次流式 GET，响应体读入复用的缓冲区后直接写入文件（或 --sink 指定的输出目标），
+        收到的字节累加到 transfer（进度计数器）。响应头带有内容 MD5 或 CRC64 时由哈希线程边写边校验。
+        限流、5xx、网络错误、响应体读到一半中断、长度不足或校验和不一致时，都在这一层退避后重新下载整个对象
+        （请求本身只发一次，不再叠加一层重试），重试用尽后校验和仍不一致则抛出 ChecksumMismatch，该对象记为失败。
+        transfer.split 被置位时在当前位置停止并返回已写入的字节数（见 RangedDownloader.download_remainder）。
+        """
+        file_url = self.object_url(key)
+        error = retry_after = None
+        with self._trace("get") as trace:
+            for attempt in range(self.retry_policy.retries + 1):
+                if attempt:
+                    logging.debug(f"Retrying {file_url} after {error} (attempt {attempt}/{self.retry_policy.retries})")
+                    trace.retries += 1
+                    time.sleep(self.retry_policy.delay(attempt - 1, retry_after))
+                    retry_after = None
+                try:
+                    with self._get_once(file_url, trace, headers=self._request_headers(), stream=True,
+                                        timeout=10) as response:
+                        if response.status_code in RETRYABLE_STATUS:
+                            error, retry_after = response.status_code, retry_after_seconds(response.headers)
+                            continue
+                        if response.status_code != 200:
+                            self._log_error("Download object", file_url, response.status_code)
+                            return
+                        digest = start_digest(response.headers)
+                        with self.open_output(local_path, size, self.preallocate) as f:
+                            written = write_stream(response.raw, f, size, self.buffer_size, transfer, digest)
+                        trace.read(written)
+                except RETRYABLE_ERRORS as e:
+                    trace.error = repr(e)
+                    error = e
+                    continue
+                except requests.exceptions.RequestException as e:
+                    trace.error = repr(e)
+                    self._log_error("Download object", file_url, e)
+                    return
+                except Exception as e:
+                    error = e
+                    continue
+
+                if transfer is not None and transfer.split and size is not None and written < size:
+                    # 拖尾对象被拆分：保留已写入的前缀，返回它的长度，剩余部分由调用方分段下载
+                    return written
+                if size is not None and written != size:
+                    error = f"connection closed after {written} of {size} bytes"
+                elif digest is not None and not digest.matches():
+                    error = ChecksumMismatch(f"{digest.algorithm} checksum mismatch")
+                else:
+                    return
+
+            trace.error = str(error)
+            self._log_error("Download object", file_url, error)
+            if isinstance(error, ChecksumMismatch):
+                raise error
+
+    def head_object(self, key):
+        """HEAD 一个对象，返回响应头（用于 --verify 取得校验和），失败时返回 None。"""
+        file_url = self.object_url(key)
+        with self._trace("head") as trace:
+            try:
+                response = request_with_retry(self.session.head, file_url, self.retry_policy, self.throttle, trace,
+                                              headers=self._request_headers(), timeout=10)
+            except RETRYABLE_ERRORS as e:
+                self._log_error("Head object", file_url, e)
+                return None
+        if response.status_code != 200:
+            self._log_error("Head object", file_url, response.status_code)
+            return None
+        return response.headers
+
     def _log_error(self, action, url, status_code):
         logging.warning(f"[Error] {action} failed for URL: {url}. Status code: {status_code}")
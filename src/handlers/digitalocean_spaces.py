@@ -1,10 +1,8 @@
-from src.handlers.ibm_cos import IBMCloudObjectStorageHandler
+from src.handlers.s3_compatible import S3CompatibleHandler
 
 
-class DigitalOceanSpacesHandler(IBMCloudObjectStorageHandler):
+class DigitalOceanSpacesHandler(S3CompatibleHandler):
     """
-    DigitalOceanSpacesHandler 继承自 IBMCloudObjectStorageHandler。
-    DigitalOcean Spaces 接口完全兼容 S3 API，因此可以直接使用 IBMCloudObjectStorageHandler 的逻辑。
+    DigitalOcean Spaces 接口兼容 S3 API，列举返回 ListBucketResult XML，直接使用 S3CompatibleHandler 的逻辑。
     该设计便于未来扩展 DigitalOcean 特有的逻辑。
     """
-    pass
\ No newline at end of file
@@ -0,0 +1,207 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 键空间扁平（没有公共前缀）时，按这些可打印字符切分字典序区间
+RANGE_ALPHABET = "".join(chr(c) for c in range(0x21, 0x7f))
+
+# 分片时字典序区间的个数，固定不变，与 --list-workers 无关
+SHARD_RANGES = len(RANGE_ALPHABET)
+
+_DONE = object()
+
+
+class ListingError(Exception):
+    """一页列举请求在重试用尽后仍然失败。"""
+
+
+class PartitionedLister:
+    """
+    并发列举引擎：先用 delimiter 发现公共前缀，把每个前缀作为一个分区交给线程池；
+    若键空间是扁平的且 marker 就是对象键，则改为按字典序区间 [lo, hi) 切分。
+    各分区互不重叠（区间分区还会按边界过滤），合并后的分页流中每个键只出现一次。
+
+    传入 cursors 时为每个叶子分区保存游标，续传时跳过已列举完的分区、其余分区从游标处继续；
+    发现公共前缀的 delimiter 列举每次都会重新执行，其中的对象交由 cursors 的调用方去重。
+    某个分区列举失败（ListingError）时只结束该分区，其余分区照常进行，失败次数记在 handler.list_errors 中。
+
+    传入 shard（--shard i/N）时只列举本分片拥有的叶子分区（按分区名的 CRC32 分配），叶子分区之外列举到的对象按键名筛选。
+    分区的划分只取决于存储桶的内容：字典序区间固定切成 SHARD_RANGES 个，workers 只决定并发数，
+    所以各分片即使 --list-workers 或引擎不同，对每个对象的归属也一致。
+    """
+
+    def __init__(self, handler, workers, delimiter="/", max_depth=2, cursors=None, shard=None):
+        self.handler = handler
+        self.workers = workers
+        self.delimiter = delimiter
+        self.max_depth = max_depth
+        self.cursors = cursors
+        self.shard = shard
+        self.pages = queue.Queue(maxsize=workers * 4)
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.seen_prefixes = set()
+        self.executor = None
+
+    def run(self, prefix=""):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lister") as self.executor:
+            self._submit(self._list_root, prefix)
+            try:
+                while True:
+                    item = self.pages.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+
+                    # 调用方处理完这一页后才保存游标，中断时不会丢页
+                    keys, checkpoint = item
+                    yield keys
+                    if checkpoint is not None and self.cursors is not None:
+                        self.cursors.save_cursor(*checkpoint)
+            finally:
+                # 消费方提前退出或出错时，让仍在运行的分区尽快结束
+                self.stopped.set()
+                while not self.pages.empty():
+                    self.pages.get_nowait()
+
+    def _submit(self, fn, *args):
+        with self.lock:
+            self.pending += 1
+        self.executor.submit(self._run_task, fn, *args)
+
+    def _run_task(self, fn, *args):
+        try:
+            if not self.stopped.is_set():
+                fn(*args)
+        except ListingError:
+            # 已记录日志和 list_errors，分区游标停在最后一页成功处，--resume 时从那里继续
+            pass
+        except Exception as e:
+            self._emit(e)
+        finally:
+            with self.lock:
+                self.pending -= 1
+                finished = self.pending == 0
+            if finished:
+                self._emit(_DONE)
+
+    def _emit_page(self, keys, checkpoint=None, owned=False):
+        # 不属于某个叶子分区的对象每个分片都会列举到，按键名分配
+        if self.shard is not None and not owned:
+            keys = self.shard.select(keys)
+        if keys or checkpoint is not None:
+            self._emit((keys, checkpoint))
+
+    def _emit(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _list_root(self, prefix):
+        handler = self.handler
+        if not handler.supports_delimiter:
+            if handler.marker_is_key:
+                self._split_ranges(prefix, None)
+            else:
+                self._list_all(prefix, leaf=False)
+            return
+
+        page = handler.list_page(prefix, None, self.delimiter)
+        self._emit_page(page.keys)
+
+        if not page.prefixes and page.next_marker is not None and handler.marker_is_key and page.keys:
+            # 扁平键空间：剩余部分按字典序区间并发列举
+            self._split_ranges(prefix, page.keys[-1][0])
+            return
+
+        self._expand(prefix, page, 0)
+
+    def _expand(self, prefix, page, depth):
+        """消费 delimiter 列举结果：直接产出本层对象，把每个新的公共前缀作为分区提交。"""
+        while True:
+            for sub_prefix in page.prefixes:
+                with self.lock:
+                    if sub_prefix in self.seen_prefixes:
+                        continue
+                    self.seen_prefixes.add(sub_prefix)
+                self._submit(self._list_prefix, sub_prefix, depth + 1)
+
+            if page.next_marker is None or self.stopped.is_set():
+                break
+            page = self.handler.list_page(prefix, page.next_marker, self.delimiter)
+            self._emit_page(page.keys)
+
+    def _list_prefix(self, prefix, depth):
+        if depth < self.max_depth:
+            page = self.handler.list_page(prefix, None, self.delimiter)
+            self._emit_page(page.keys)
+            self._expand(prefix, page, depth)
+        else:
+            self._list_all(prefix)
+
+    def _saved_cursor(self, partition, marker=None):
+        """返回分区的起始 marker；分区已列举完时返回 False。"""
+        if self.cursors is not None:
+            saved = self.cursors.cursor(partition)
+            if saved is not None:
+                return False if saved[1] else saved[0]
+        return marker
+
+    def _owns(self, partition):
+        return self.shard is None or self.shard.owns(partition)
+
+    def _list_all(self, prefix, leaf=True):
+        """leaf 为 False 时整个键空间只有这一个分区（不能分区列举），分片时每个分片都要列举它。"""
+        partition = f"prefix:{prefix}"
+        if leaf and not self._owns(partition):
+            return
+        marker = self._saved_cursor(partition)
+        if marker is False:
+            return
+
+        while not self.stopped.is_set():
+            page = self.handler.list_page(prefix, marker)
+            self._emit_page(page.keys, (partition, page.next_marker), owned=leaf)
+            marker = page.next_marker
+            if marker is None:
+                break
+
+    def _split_ranges(self, prefix, after):
+        count = SHARD_RANGES if self.shard is not None else min(self.workers * 4, len(RANGE_ALPHABET))
+        bounds = [prefix + RANGE_ALPHABET[i * len(RANGE_ALPHABET) // count] for i in range(1, count)]
+        ranges = zip([None] + bounds, bounds + [None])
+        for lo, hi in ranges:
+            if hi is not None and after is not None and hi <= after:
+                continue
+            self._submit(self._list_range, prefix, lo, hi, after)
+
+    def _list_range(self, prefix, lo, hi, after):
+        partition = f"range:{prefix}:{lo or ''}:{hi or ''}"
+        if not self._owns(partition):
+            return
+
+        # marker 只需小于区间下界即可，越界的键由下方的区间过滤去掉
+        marker = after
+        if lo is not None and (after is None or after < lo):
+            marker = lo[:-1] + chr(ord(lo[-1]) - 1) + "\uffff"
+
+        marker = self._saved_cursor(partition, marker)
+        if marker is False:
+            return
+
+        while not self.stopped.is_set():
+            page = self.handler.list_page(prefix, marker)
+            keys = [item for item in page.keys
+                    if (lo is None or item[0] >= lo) and (hi is None or item[0] < hi)
+                    and (after is None or item[0] > after)]
+
+            if page.next_marker is None or (hi is not None and page.keys and page.keys[-1][0] >= hi):
+                self._emit_page(keys, (partition, None), owned=True)
+                break
+            self._emit_page(keys, (partition, page.next_marker), owned=True)
+            marker = page.next_marker
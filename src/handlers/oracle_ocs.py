@@ -1,10 +1,8 @@
-from src.handlers.ibm_cos import IBMCloudObjectStorageHandler
+from src.handlers.s3_compatible import S3CompatibleHandler
 
 
-class OracleCloudStorageHandler(IBMCloudObjectStorageHandler):
+class OracleCloudStorageHandler(S3CompatibleHandler):
     """
-    OracleCloudStorageHandler 继承自 IBMCloudObjectStorageHandler。
-    Oracle Cloud 的对象存储接口类似于 AWS S3 和 IBM COS，
-    因此可以直接复用 IBMCloudObjectStorageHandler 的逻辑。
+    Oracle Cloud 对象存储的 S3 兼容接口（<namespace>.compat.objectstorage.<region>.oraclecloud.com），
+    列举返回 ListBucketResult XML，直接使用 S3CompatibleHandler 的逻辑。
     """
-    pass
@@ -0,0 +1,33 @@
+from src.handlers.base import BucketHandler, ListPage
+from src.handlers.xml_listing import S3_LISTING, parse_listing
+
+
+class S3CompatibleHandler(BucketHandler):
+    """
+    S3 兼容服务共用的处理器：用共享的 requests 会话匿名访问虚拟主机风格的存储桶地址，
+    列举结果是 ListBucketResult XML，由 parse_listing 解析；各云厂商只需继承并按需调整类属性。
+    list_type = 1 使用 ListObjects（marker 就是对象键，可以按字典序区间并发列举）；
+    list_type = 2 使用 ListObjectsV2（continuation-token 是不透明令牌）。
+    """
+    list_type = 1
+    # 每页对象数，S3 及兼容服务的上限都是 1000
+    max_keys = 1000
+
+    def __init__(self, bucket_url, session):
+        self.bucket_url = bucket_url
+        self.session = session
+
+    def _list_request(self, prefix=None, marker=None, delimiter=None):
+        params = {"max-keys": str(self.max_keys)}
+        if self.list_type == 2:
+            params['list-type'] = "2"
+        if prefix:
+            params['prefix'] = prefix
+        if marker:
+            params['continuation-token' if self.list_type == 2 else 'marker'] = marker
+        if delimiter:
+            params['delimiter'] = delimiter
+        return self.bucket_url, params
+
+    def _parse_listing(self, response) -> ListPage:
+        return parse_listing(response.content, S3_LISTING)
@@ -0,0 +1,105 @@
+import logging
+import xml.etree.ElementTree as ET
+from typing import NamedTuple, Optional, Tuple
+
+from src.handlers.base import ListPage, ObjectInfo, normalize_etag
+
+
+class ListingSchema(NamedTuple):
+    """列举响应中的元素名（不含命名空间）。都用单级元素名，查找时走 C 实现的快速路径。"""
+    container: Optional[str]  # 对象和公共前缀所在的元素，None 表示直接在根元素下
+    record: str  # 每个对象对应的元素
+    properties: Optional[str]  # 对象内存放 size、etag、last_modified 的元素，None 表示就在对象元素下
+    fields: Tuple[str, str, str, str]  # key、size、etag、last_modified
+    prefix_group: str  # 公共前缀
+    prefix: str
+    truncated: Optional[str]  # 是否还有下一页；None 表示以下一页标记是否为空判断
+    next_markers: Tuple[str, ...]
+    storage_class: Optional[str] = None  # 存储类别（与 size 等在同一元素下），None 表示列举结果中没有
+
+
+# S3 兼容的 ListBucketResult（OSS、COS、OBS、GCS XML API 等）
+S3_LISTING = ListingSchema(
+    container=None,
+    record="Contents",
+    properties=None,
+    fields=("Key", "Size", "ETag", "LastModified"),
+    prefix_group="CommonPrefixes",
+    prefix="Prefix",
+    truncated="IsTruncated",
+    next_markers=("NextMarker", "NextContinuationToken"),
+    storage_class="StorageClass",
+)
+
+# Azure Blob 的 EnumerationResults：没有 IsTruncated，NextMarker 非空即还有下一页
+AZURE_LISTING = ListingSchema(
+    container="Blobs",
+    record="Blob",
+    properties="Properties",
+    fields=("Name", "Content-Length", "Etag", "Last-Modified"),
+    prefix_group="BlobPrefix",
+    prefix="Name",
+    truncated=None,
+    next_markers=("NextMarker",),
+    storage_class="AccessTier",
+)
+
+_qualified = {}
+
+
+def _qualify(schema: ListingSchema, namespace: str) -> ListingSchema:
+    """给每个元素名加上根元素的命名空间（如 OBS、S3 的默认命名空间），结果按命名空间缓存。"""
+    cached = _qualified.get((schema, namespace))
+    if cached is None:
+        def tag(name):
+            return name and namespace + name
+
+        cached = _qualified[(schema, namespace)] = ListingSchema(
+            tag(schema.container), tag(schema.record), tag(schema.properties),
+            tuple(tag(field) for field in schema.fields), tag(schema.prefix_group), tag(schema.prefix),
+            tag(schema.truncated), tuple(tag(marker) for marker in schema.next_markers), tag(schema.storage_class))
+    return cached
+
+
+def parse_listing(content, schema: ListingSchema = S3_LISTING) -> ListPage:
+    """
+    解析一页列举响应，返回由 ObjectInfo(key, size, etag, last_modified, storage_class) 组成的 ListPage。
+    元素树由 C 实现的解析器一次构建，之后只按单级元素名查找直接子元素，不做 .// 全树扫描；
+    命名空间取自根元素，S3、OBS、Azure 等格式都在这里处理。
+    """
+    root = ET.fromstring(content)
+    namespace = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    schema = _qualify(schema, namespace)
+    key_tag, size_tag, etag_tag, last_modified_tag = schema.fields
+    storage_class_tag = schema.storage_class
+
+    container = root if schema.container is None else root.find(schema.container)
+    if container is None:
+        container = root
+
+    keys = []
+    for record in container.findall(schema.record):
+        properties = record if schema.properties is None else record.find(schema.properties)
+        key = record.findtext(key_tag)
+        size = properties.findtext(size_tag) if properties is not None else None
+        if key is None or size is None:
+            logging.warning("Key or Size element missing in XML response.")
+            continue
+        keys.append(ObjectInfo(key, int(size), normalize_etag(properties.findtext(etag_tag)),
+                               properties.findtext(last_modified_tag),
+                               properties.findtext(storage_class_tag) if storage_class_tag else None))
+
+    prefixes = [group.findtext(schema.prefix) for group in container.findall(schema.prefix_group)]
+
+    next_marker = None
+    if schema.truncated is None or root.findtext(schema.truncated) == "true":
+        for marker in schema.next_markers:
+            next_marker = root.findtext(marker)
+            if next_marker:
+                break
+        if not next_marker and schema.truncated is not None:
+            # S3 ListObjects 不带 delimiter 时不返回 NextMarker，下一页从本页最后一个键（或公共前缀）之后开始
+            last_items = [item.key for item in keys[-1:]] + prefixes[-1:]
+            next_marker = max(last_items) if last_items else None
+        next_marker = next_marker or None
+    return ListPage(keys, prefixes, next_marker)
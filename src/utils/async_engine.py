@@ -0,0 +1,425 @@
+import asyncio
+import logging
+import os
+
+from src.handlers import BucketFactory
+from src.handlers.listing import ListingError, PartitionedLister
+from src.utils.bucket_handler import finish_bucket, grow_total, prepare_bucket, progress_desc, sync_filter
+from src.utils.checksum import start_digest
+from src.utils.dedup import WAITING, DedupIndex
+from src.utils.scheduler import endpoint_of
+from src.utils.manifest import FAILED, Manifest
+from src.utils.progress import Progress
+from src.utils.retry import RETRYABLE_STATUS, THROTTLE_STATUS, ConcurrencyController, RetryPolicy, retry_after_seconds
+from src.utils.selection import Selection
+from src.utils.sinks import FileSink
+from src.utils.stream import write_all
+
+_DONE = object()
+
+# 每个对象在事件循环中最多攒这么多字节，再整块交给线程写出
+WRITE_BATCH = 256 * 1024
+
+
+def process_buckets_async(bucket_urls, args, metrics=None, sink=None):
+    """
+    异步引擎：用一个事件循环和一个 httpx.AsyncClient 驱动所有存储桶的列举和下载。
+    并发数由 --concurrency 限定，连接池按主机复用连接，跨存储桶保持长连接。
+    同时处理 --bucket-workers 个存储桶，单个存储桶的并发下载数受 --per-bucket 限制；单个端点的并发下载数
+    与线程引擎一样由 AIMD 控制器调整（上限为 --per-endpoint），遇到限流时减半，响应正常时逐步回升。
+    文件写入、清单（SQLite）读写和统计都交给线程执行，事件循环只处理网络 I/O，不会因为磁盘而停顿。
+    """
+    try:
+        import httpx
+    except ImportError:
+        logging.error("The async engine requires httpx. Install it with: pip install 'httpx[http2,socks]'")
+        return
+
+    asyncio.run(_process_buckets(httpx, bucket_urls, args, metrics, sink or FileSink()))
+
+
+async def _process_buckets(httpx, bucket_urls, args, metrics, sink):
+    limits = httpx.Limits(max_connections=args.concurrency,
+                          max_keepalive_connections=args.concurrency if args.keepalive > 0 else 0,
+                          keepalive_expiry=args.keepalive)
+    async with httpx.AsyncClient(limits=limits, http2=args.http2, proxy=args.proxy, verify=False,
+                                 trust_env=not args.proxy, timeout=10) as client:
+        buckets = asyncio.Semaphore(args.bucket_workers)
+        controller = ConcurrencyController(args.per_endpoint or args.concurrency)
+        endpoints = {}
+        dedup = DedupIndex() if args.dedup else None
+        with Progress(progress_desc(bucket_urls)) as progress:
+            await asyncio.gather(*(_process_bucket(httpx, client, bucket_url, buckets, controller, endpoints, dedup,
+                                                   metrics, sink, progress, args)
+                                   for bucket_url in bucket_urls))
+        if dedup is not None:
+            dedup.log_summary()
+
+
+async def _process_bucket(httpx, client, bucket_url, buckets, controller, endpoints, dedup, metrics, sink, progress,
+                          args):
+    async with buckets:
+        bucket_name, log_dir = prepare_bucket(bucket_url, args.module, args.shard)
+        if log_dir is None:
+            return
+
+        # 处理器只用来构造请求和解析响应，网络 I/O 全部由 client 完成
+        endpoint_name = endpoint_of(bucket_url, bucket_name)
+        endpoint = endpoints.get(endpoint_name)
+        if endpoint is None:
+            endpoint = endpoints[endpoint_name] = _EndpointGate(controller.for_endpoint(endpoint_name))
+        bucket_handler = BucketFactory.get_handler(bucket_url, None, args.module)
+        bucket_handler.set_retry_options(RetryPolicy(args.retries, args.backoff), endpoint.throttle)
+        bucket_handler.set_metrics(metrics, bucket_name, endpoint_name)
+
+        manifest = await asyncio.to_thread(Manifest, os.path.join(log_dir, "manifest.db"), resume=args.resume,
+                                           sync=args.sync)
+        with manifest:
+            listed = False
+            try:
+                await _download_bucket(client, bucket_handler, bucket_name, manifest, progress, endpoint, dedup, sink,
+                                       log_dir, args)
+                listed = not bucket_handler.list_errors
+            except ListingError:
+                logging.warning(f"Listing of {bucket_url} stopped after retries. "
+                                f"Run again with --resume to continue from the last good page.")
+            except httpx.TimeoutException:
+                logging.error(f"Timeout while trying to access {bucket_url}. Please check your connection and try again.")
+            except Exception as e:
+                logging.error(f"An error occurred while accessing {bucket_url}: {str(e)}")
+
+            # 归档或 MinIO 输出在对象写出后才更新清单，先等这个存储桶的对象全部写出
+            await asyncio.to_thread(sink.flush, manifest)
+            # 遍历整个清单写 downloads.log，在线程中执行
+            await asyncio.to_thread(finish_bucket, manifest, bucket_url, bucket_name, log_dir, args, listed)
+        progress.finish_bucket(bucket_name)
+
+
+async def _download_bucket(client, bucket_handler, bucket_name, manifest, progress, endpoint, dedup, sink, log_dir,
+                           args):
+    worker_count = min(args.per_bucket or args.concurrency, args.concurrency)
+    queue = asyncio.Queue(maxsize=worker_count * 2)
+    workers = [asyncio.create_task(_download_worker(client, bucket_handler, bucket_name, queue, manifest, progress,
+                                                    endpoint, dedup, sink))
+               for _ in range(worker_count)]
+
+    async def enqueue(keys):
+        # 目录树在事件循环之外创建
+        await asyncio.to_thread(sink.prepare, bucket_name, keys)
+        for item in grow_total(keys, progress, bucket_name):
+            await queue.put(item)
+
+    try:
+        if manifest.resumed:
+            async for keys in _in_thread(manifest.pending_objects()):
+                await enqueue(keys)
+
+        is_current = sync_filter(args, bucket_name)
+        selection = Selection.from_args(args, spill_dir=log_dir)
+        selection.resume(manifest)
+        # 排序选择要等整个存储桶列举完，此时不保存游标，续传时重新列举
+        cursors = None if selection.ordered else manifest
+        listing = None
+        if args.shard is not None:
+            # 分片时与线程引擎使用同一份分区规划，只列举本分片的分区；分区列举在线程中进行，请求仍由 client 发出
+            listing = PartitionedLister(_LoopListing(client, bucket_handler, asyncio.get_running_loop()),
+                                        max(args.list_workers, 1), cursors=cursors,
+                                        shard=args.shard).run(args.prefix or "")
+        try:
+            pages = _list_objects(client, bucket_handler, cursors, args.prefix) if listing is None \
+                else _in_thread(listing)
+            async for keys in pages:
+                select = selection.collect if selection.ordered else selection.select_page
+                await enqueue(await asyncio.to_thread(manifest.record_page, keys, is_current, select))
+        finally:
+            if listing is not None:
+                # 提前结束时让仍在运行的分区停下，它们的请求需要事件循环继续运转
+                await asyncio.to_thread(listing.close)
+        async for keys in _in_thread(selection.ordered_pages()):
+            await enqueue(await asyncio.to_thread(manifest.record_page, keys, is_current))
+    finally:
+        # 先等已入队的对象处理完再放入结束标记；工作协程全部意外退出时不再等待，避免在有界队列上永远阻塞
+        drained = asyncio.ensure_future(queue.join())
+        finished = asyncio.gather(*workers)
+        await asyncio.wait([drained, finished], return_when=asyncio.FIRST_COMPLETED)
+        drained.cancel()
+        if not finished.done():
+            for _ in workers:
+                queue.put_nowait(_DONE)
+        await finished
+
+
+async def _in_thread(pages):
+    """逐页在线程中从 pages（读取清单或溢出文件的生成器）取出下一页，事件循环不等待磁盘。"""
+    pages = iter(pages)
+    while True:
+        keys = await asyncio.to_thread(next, pages, None)
+        if keys is None:
+            return
+        yield keys
+
+
+async def _list_objects(client, bucket_handler, cursors, prefix=None, partition=""):
+    """与 BucketHandler.list_objects 相同的翻页逻辑，调用方处理完一页后才保存游标（cursors 为 None 时不保存）。"""
+    marker = None
+    saved = cursors.cursor(partition) if cursors is not None else None
+    if saved is not None:
+        marker, done = saved
+        if done:
+            return
+
+    while True:
+        page = await _list_page(client, bucket_handler, prefix, marker)
+        yield page.keys
+
+        # 如果没有下一页，则退出循环
+        marker = page.next_marker
+        if cursors is not None:
+            await asyncio.to_thread(cursors.save_cursor, partition, marker)
+        if marker is None:
+            break
+
+
+async def _list_page(client, bucket_handler, prefix=None, marker=None, delimiter=None):
+    """与 BucketHandler.list_page 相同：请求并解析一页，重试用尽后记录日志并抛出 ListingError。"""
+    url, params = bucket_handler._list_request(prefix, marker, delimiter)
+    with bucket_handler._trace("list") as trace:
+        try:
+            response = await _get_with_retry(client, bucket_handler.retry_policy, url, trace, bucket_handler.throttle,
+                                             params=params, headers=bucket_handler._request_headers())
+        except Exception as e:
+            bucket_handler._log_error("Listing objects", url, e)
+            bucket_handler.list_errors += 1
+            raise ListingError(url, e) from e
+        trace.read(len(response.content))
+    if response.status_code != 200:
+        bucket_handler._log_error("Listing objects", url, response.status_code)
+        bucket_handler.list_errors += 1
+        raise ListingError(url, response.status_code)
+    return bucket_handler._parse_listing(response)
+
+
+async def _download_worker(client, bucket_handler, bucket_name, queue, manifest, progress, endpoint, dedup, sink):
+    while True:
+        item = await queue.get()
+        if item is _DONE:
+            break
+
+        # 单个对象出错只把它记为失败，工作协程继续处理队列中的其他对象
+        transfer = None
+        claimed = committed = False
+        try:
+            local_path = sink.path(bucket_name, item.key)
+            source = await _claim(dedup, item, local_path) if dedup is not None else None
+            claimed = dedup is not None and source is None
+            transfer = progress.start(bucket_name, item.size)
+            if source is not None:
+                # 相同内容已下载完成，直接链接，不发出 GET
+                try:
+                    await asyncio.to_thread(dedup.link, source, local_path, item.size)
+                    succeeded = True
+                except OSError as e:
+                    logging.warning(f"Linking {local_path} to {source} failed: {e}")
+                    succeeded = False
+                await asyncio.to_thread(sink.commit, item, local_path, manifest, succeeded)
+                committed = True
+            else:
+                async with endpoint:
+                    succeeded = await _download_object(client, bucket_handler, item.key, local_path, sink, transfer)
+                # 核对文件、记入清单，提交给归档或 MinIO 时还可能等待写出队列，都不在事件循环上执行
+                completed = await asyncio.to_thread(sink.commit, item, local_path, manifest, succeeded)
+                committed = True
+                if claimed:
+                    claimed = False
+                    dedup.resolve(item, completed)
+        except Exception as e:
+            logging.warning(f"[Error] Download object failed for URL: {bucket_handler.object_url(item.key)}. "
+                            f"Error: {e}")
+            if not committed:
+                await asyncio.to_thread(manifest.mark, item.key, FAILED)
+            if claimed:
+                # 等待相同内容的对象改为自己下载
+                dedup.resolve(item, False)
+        finally:
+            if transfer is not None:
+                progress.finish(transfer)
+            queue.task_done()
+
+
+async def _claim(dedup, item, local_path):
+    """认领对象内容，相同内容正在下载时等它结束后重新认领；返回 None 表示由自己下载，否则返回源文件路径。"""
+    while True:
+        finished = asyncio.Event()
+        source = dedup.claim(item, local_path, finished.set)
+        if source is not WAITING:
+            return source
+        await finished.wait()
+
+
+async def _get_with_retry(client, policy, url, trace, throttle=None, **kwargs):
+    """
+    与 request_with_retry 相同的重试规则：可重试的状态码和网络错误退避后重试，返回最后一次响应。
+    传入 throttle（端点的 AdaptiveLimit）时把限流、超时和正常响应反馈给它。
+    """
+    attempt = 0
+    while True:
+        trace.sent()
+        try:
+            response = await client.get(url, **kwargs)
+        except Exception as e:
+            trace.error = repr(e)
+            _feed_back(throttle, error=e)
+            if attempt >= policy.retries:
+                raise
+            wait = policy.delay(attempt)
+        else:
+            trace.received(response)
+            _feed_back(throttle, response.status_code)
+            if response.status_code not in RETRYABLE_STATUS or attempt >= policy.retries:
+                return response
+            wait = policy.delay(attempt, retry_after_seconds(response.headers))
+        attempt += 1
+        trace.retries += 1
+        await asyncio.sleep(wait)
+
+
+def _feed_back(throttle, status=None, error=None):
+    """与 request_with_retry 相同：限流状态码和超时降低端点的并发上限，非重试类的响应让它回升。"""
+    if throttle is None:
+        return
+    if error is not None:
+        # 只有 process_buckets_async 成功导入 httpx 后才会走到这里
+        import httpx
+
+        if isinstance(error, httpx.TimeoutException):
+            throttle.on_throttle()
+    elif status in THROTTLE_STATUS:
+        throttle.on_throttle()
+    elif status not in RETRYABLE_STATUS:
+        throttle.on_success()
+
+
+async def _download_object(client, bucket_handler, key, local_path, sink, transfer):
+    """
+    下载一个对象；限流、5xx、网络错误、响应体中断和校验和不一致都会退避后重新下载，重试用尽才记为失败。
+    校验和由哈希线程计算，数据块在写出线程中交给哈希线程（其队列有界，放入时可能等待），事件循环不会被阻塞。
+    """
+    file_url = bucket_handler.object_url(key)
+    policy = bucket_handler.retry_policy
+    with bucket_handler._trace("get") as trace:
+        for attempt in range(policy.retries + 1):
+            retry_after = None
+            trace.sent()
+            try:
+                async with client.stream("GET", file_url, headers=bucket_handler._request_headers()) as response:
+                    trace.received(response)
+                    _feed_back(bucket_handler.throttle, response.status_code)
+                    if response.status_code == 200:
+                        written = 0
+                        digest = start_digest(response.headers)
+                        writer = _ThreadedWriter(sink, local_path, digest)
+                        try:
+                            async for chunk in response.aiter_bytes():
+                                await writer.write(chunk)
+                                written += len(chunk)
+                                transfer.bytes += len(chunk)
+                        finally:
+                            await writer.close()
+                        trace.read(written)
+                        if digest is None or await asyncio.wrap_future(digest.future):
+                            return True
+                        error = f"{digest.algorithm} checksum mismatch"
+                    elif response.status_code not in RETRYABLE_STATUS:
+                        bucket_handler._log_error("Download object", file_url, response.status_code)
+                        return False
+                    else:
+                        error, retry_after = response.status_code, retry_after_seconds(response.headers)
+            except Exception as e:
+                _feed_back(bucket_handler.throttle, error=e)
+                error = e
+
+            if attempt < policy.retries:
+                trace.retries += 1
+                await asyncio.sleep(policy.delay(attempt, retry_after))
+
+        trace.error = str(error)
+        bucket_handler._log_error("Download object", file_url, error)
+        return False
+
+
+class _ThreadedWriter:
+    """
+    在事件循环之外写入对象：数据块先攒到 WRITE_BATCH 字节，再整块交给线程写出；sink.open 和关闭也在线程中执行。
+    不超过 WRITE_BATCH 的对象只在 close 时切换一次线程（打开、写入、关闭）。
+    传入 digest 时写出的数据也由写出线程交给哈希线程，close 之后 digest.future 给出校验结果。
+    """
+
+    def __init__(self, sink, local_path: str, digest=None) -> None:
+        self.sink = sink
+        self.local_path = local_path
+        self.digest = digest
+        self.buffer = bytearray()
+        self.file = None
+
+    async def write(self, chunk) -> None:
+        self.buffer += chunk
+        if len(self.buffer) >= WRITE_BATCH:
+            data, self.buffer = self.buffer, bytearray()
+            await asyncio.to_thread(self._write, data, False)
+
+    async def close(self) -> None:
+        data, self.buffer = self.buffer, bytearray()
+        await asyncio.to_thread(self._write, data, True)
+
+    def _write(self, data, last: bool) -> None:
+        if self.file is None:
+            self.file = self.sink.open(self.local_path)
+            self.file.__enter__()
+        try:
+            if data:
+                write_all(self.file, data)
+                if self.digest is not None:
+                    # 每批都是新的 bytearray，之后不会被改写，直接交给哈希线程
+                    self.digest.update(data)
+        finally:
+            if last:
+                self.file.__exit__(None, None, None)
+                if self.digest is not None:
+                    self.digest.finish()
+
+
+class _LoopListing:
+    """交给 PartitionedLister 的列举接口：分区列举线程调用 list_page 时，把请求交回事件循环由 client 发出并等待结果。"""
+
+    def __init__(self, client, bucket_handler, loop) -> None:
+        self.client = client
+        self.bucket_handler = bucket_handler
+        self.loop = loop
+        self.marker_is_key = bucket_handler.marker_is_key
+        self.supports_delimiter = bucket_handler.supports_delimiter
+
+    def list_page(self, prefix=None, marker=None, delimiter=None):
+        return asyncio.run_coroutine_threadsafe(
+            _list_page(self.client, self.bucket_handler, prefix, marker, delimiter), self.loop).result()
+
+
+class _EndpointGate:
+    """
+    端点的并发闸门：同时进行的下载数不超过 throttle（AdaptiveLimit）的当前上限。
+    上限降低后，在途下载结束前不再放行新的下载；上限回升后，下一次有下载结束时放行等待者。
+    """
+
+    def __init__(self, throttle) -> None:
+        self.throttle = throttle
+        self.inflight = 0
+        self.changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.inflight < self.throttle.limit)
+            self.inflight += 1
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        async with self.changed:
+            self.inflight -= 1
+            self.changed.notify_all()
@@ -1,60 +1,174 @@
 import logging
 import os
 
-import requests
-from tqdm import tqdm
-
-from src.handlers import BucketFactory
-from src.utils.downloader import download_files, log_download_stats
+from src.utils.downloader import local_path_for, log_download_stats
 from src.utils.helpers import validate_module
+from src.utils.metrics import Metrics
+from src.utils.selection import Selection
+from src.utils.shard import LISTED_PARTITION, merge_shards
+from src.utils.sinks import open_sink
+from src.utils.sync import local_copy_current, report_deletions
+
+MB = 1024 * 1024
+
+
+def process_buckets(bucket_urls, session, args):
+    """
+    处理所有存储桶，边列举边下载文件，列举结果与下载状态记录在清单中以便续传。
+    同时处理 --bucket-workers 个存储桶，共用下载线程池，由全局调度器公平分配。
+    """
+    metrics = Metrics(args.metrics)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    sink = None
+    try:
+        if args.merge_shards:
+            # 只合并各分片的日志和清单，不访问存储桶
+            merge_shards(bucket_urls, args)
+            return
+
+        if args.list_only:
+            # 只列举并导出清单，不下载，也不打开下载目标
+            from src.utils.inventory import export_inventories
+            export_inventories(bucket_urls, session, args, metrics)
+            return
+
+        if args.verify:
+            # 只核对已下载的本地文件，不列举也不下载
+            from src.utils.verify import verify_buckets
+            verify_buckets(bucket_urls, session, args, metrics)
+            return
+
+        sink = open_sink(args)
+        if args.engine == "async":
+            # 异步引擎依赖可选的 httpx，只在选用时导入
+            from src.utils.async_engine import process_buckets_async
+            process_buckets_async(bucket_urls, args, metrics, sink)
+            return
+
+        # 调度器导入本模块的辅助函数，在这里导入以避免循环引用
+        from src.utils.scheduler import BucketScheduler
+        BucketScheduler(session, args, metrics, sink).run(bucket_urls)
+    finally:
+        if sink is not None:
+            sink.close()
+        metrics.log_summary()
+        metrics.close()
+
+    # 连接复用情况（跨存储桶累计）
+    pool_stats = getattr(session, "pool_stats", None)
+    if pool_stats is not None and pool_stats.requests:
+        logging.info(pool_stats.summary())
+
+
+def prepare_bucket(bucket_url, module, shard=None):
+    """
+    校验 URL 与模块是否匹配并创建日志目录，返回 (bucket_name, log_dir)，不匹配时 log_dir 为 None。
+    分片运行（--shard）时每个分片使用自己的子目录 log/<module>/<bucket>/shard-i-of-N，之后用 --merge-shards 合并。
+    """
+    bucket_name = bucket_name_of(bucket_url)
+
+    # URL 和模块类型匹配校验
+    if not validate_module(bucket_url, module):
+        return bucket_name, None
+
+    log_dir = f"log/{module}/{bucket_name}"
+    if shard is not None:
+        log_dir = os.path.join(log_dir, shard.dir_name)
+    os.makedirs(log_dir, exist_ok=True)
+    return bucket_name, log_dir
+
+
+def bucket_name_of(bucket_url):
+    return bucket_url.split("//")[1].split(".")[0]
+
+
+def progress_desc(bucket_urls, action="Downloading from"):
+    """进度条标题：单个存储桶显示名称，多个存储桶汇总到一个进度条。"""
+    if len(bucket_urls) == 1:
+        return f"{action} {bucket_name_of(bucket_urls[0])}"
+    return f"{action} {len(bucket_urls)} buckets"
+
+
+def sync_filter(args, bucket_name):
+    """--sync 时只下载新增或变化的对象：先比对清单索引，再确认本地副本（输出到归档或 MinIO 时只比对清单）。"""
+    if not args.sync or args.sink != "fs":
+        return None
+
+    def is_current(item):
+        return local_copy_current(item, local_path_for(bucket_name, item.key, args.layout))
+
+    return is_current
+
+
+def finish_bucket(manifest, bucket_url, bucket_name, log_dir, args, listed):
+    """处理同步删除，并根据清单写入 downloads.log、输出统计信息。"""
+    if args.shard is not None and listed:
+        # --merge-shards 据此确认本分片列举完整
+        manifest.save_cursor(LISTED_PARTITION, None)
+    # 只有完整列举后才能判断哪些对象已被删除；按前缀或条件筛选时未列举到的对象不一定已被删除
+    partial = args.prefix or Selection.from_args(args).filtering
+    if args.sync and listed and partial:
+        logging.info(f"Skipping deletion check for {bucket_url}: only part of the bucket was selected")
+    elif args.sync and listed:
+        if args.report_deletions:
+            report_deletions(manifest, bucket_url, log_dir)
+        manifest.forget_deleted()
+
+    file_count, total_size = manifest.summary()
+    if not file_count:
+        logging.warning(f"No files found in bucket {bucket_url}")
+        return
+
+    file_formats = set()
 
+    def file_urls():
+        for keys in manifest.iter_objects():
+            file_formats.update(calculate_stats(keys)[2])
+            for item in keys:
+                yield f"{bucket_url}/{item.key}"
 
-def process_buckets(bucket_urls, module, session, threads):
-    """处理每个存储桶，统计文件总大小和数量，下载文件。"""
-    for bucket_url in bucket_urls:
-        bucket_name = bucket_url.split("//")[1].split(".")[0]
+    # 写入日志文件
+    log_download_stats(file_count, total_size, file_urls(), os.path.join(log_dir, "downloads.log"))
 
-        # URL 和模块类型匹配校验
-        if not validate_module(bucket_url, module):
-            continue
+    # 控制台输出
+    logging.info(f"Bucket: {bucket_name}")
+    logging.info(f"Total files: {file_count}")
+    logging.info(f"Total size: {total_size / (1024 * 1024):.2f} MB")
+    logging.info(f"File formats: {', '.join(file_formats) or 'No extensions'}")
 
-        log_dir = f"log/{module}/{bucket_name}"
-        os.makedirs(log_dir, exist_ok=True)
-        log_file = os.path.join(log_dir, "downloads.log")
+    failed = manifest.failed_count()
+    if failed:
+        logging.warning(f"{failed} files failed to download after retries. Run again with --resume to retry them.")
 
-        # 生成存储桶处理器实例
-        bucket_handler = BucketFactory.get_handler(bucket_url, session, module)
 
-        try:
-            keys = bucket_handler.list_objects()
-        except requests.exceptions.ReadTimeout:
-            logging.error(f"Timeout while trying to access {bucket_url}. Please check your connection and try again.")
-            continue
-        except Exception as e:
-            logging.error(f"An error occurred while accessing {bucket_url}: {str(e)}")
-            continue
+def track_pages(pages, manifest, progress, bucket_name, is_current=None, selection=None):
+    """
+    把流经的分页记入清单，只放行需要下载的对象，并扩大进度条总量；续传时先补上次未完成的对象。
+    传入 selection 时再按筛选条件和字节预算过滤，未选中的对象不记入清单也不计入进度条。
+    """
+    if manifest.resumed:
+        for keys in manifest.pending_objects():
+            yield grow_total(keys, progress, bucket_name)
 
-        if keys:
-            total_size, file_count, file_formats = calculate_stats(keys)
+    if selection is not None:
+        pages = selection.record(pages, manifest, is_current)
+    else:
+        pages = (manifest.record_page(keys, is_current) for keys in pages)
+    for keys in pages:
+        yield grow_total(keys, progress, bucket_name)
 
-            # 控制台输出
-            logging.info(f"Bucket: {bucket_name}")
-            logging.info(f"Total files: {file_count}")
-            logging.info(f"Total size: {total_size / (1024 * 1024):.2f} MB")
-            logging.info(f"File formats: {', '.join(file_formats) or 'No extensions'}")
 
-            # 写入日志文件
-            log_download_stats(file_count, total_size, [f"{bucket_url}/{key}" for key, _ in keys], log_file)
+def grow_total(keys, progress, bucket_name):
+    # 多个存储桶的列举线程共用一个进度
+    total_size, file_count, _ = calculate_stats(keys)
+    progress.grow(bucket_name, total_size, file_count)
+    return keys
 
-            # 下载文件并显示进度条
-            with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"Downloading from {bucket_name}") as pbar:
-                download_files(bucket_handler, bucket_url, bucket_name, pbar, threads)
-        else:
-            logging.warning(f"No files found in bucket {bucket_url}")
 
 def calculate_stats(keys):
     """Calculate total size, file count, and file formats."""
-    total_size = sum(size for _, size in keys)
+    total_size = sum(item.size for item in keys)
     file_count = len(keys)
-    file_formats = set(os.path.splitext(key)[1] for key, _ in keys)
+    file_formats = set(os.path.splitext(item.key)[1] for item in keys)
     return total_size, file_count, file_formats
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import itertools
+import logging
+import queue
+import re
+import threading
+from concurrent.futures import Future
+
+# 简单上传的对象 ETag 就是内容的 MD5；分片上传的 ETag 带 "-<分片数>"，Azure 的 ETag 是版本号，都不是 MD5
+MD5_ETAG = re.compile(r"^[0-9a-fA-F]{32}$")
+
+# OSS、COS 返回整个对象的 CRC64-ECMA（十进制），分片上传的对象也有
+CRC64_HEADERS = ("x-oss-hash-crc64ecma", "x-cos-hash-crc64ecma")
+
+# 服务端用 KMS 或客户提供的密钥加密时，ETag 不是明文内容的 MD5
+_ENCRYPTION_HEADERS = ("x-amz-server-side-encryption", "x-oss-server-side-encryption",
+                       "x-cos-server-side-encryption")
+
+# CRC-64/XZ（OSS、COS 使用的 CRC64-ECMA）：反射多项式，寄存器初值和结果都异或全 1
+_CRC64_POLY = 0x142F0E1EBA9EA3693
+_CRC64_XOROUT = 0xFFFFFFFFFFFFFFFF
+
+# 计算校验和的线程数，以及每个线程待处理的数据块上限（超过时下载线程等待）
+HASH_THREADS = 2
+HASH_QUEUE_SIZE = 64
+# 每个对象轮流使用的读缓冲区数：数据块不复制，哈希线程算完后缓冲区才能再次读入
+DIGEST_BUFFERS = 4
+
+_crc64 = None
+
+
+class ChecksumMismatch(Exception):
+    """重试用尽后下载内容的校验和仍与服务端不一致。"""
+
+
+def _crc64_factory():
+    """
+    CRC64 需要可选的 crcmod（C 扩展，pip install crcmod），只在第一次用到时导入。
+    纯 Python 实现每秒只能处理几 MB，会拖慢下载，没有安装时不校验 CRC64。
+    """
+    global _crc64
+    if _crc64 is None:
+        try:
+            import crcmod
+            _crc64 = crcmod.Crc(_CRC64_POLY, initCrc=0, xorOut=_CRC64_XOROUT).new
+        except ImportError:
+            logging.info("crcmod is not installed; CRC64 checksums (OSS/COS multipart objects) are not verified. "
+                         "Install it with: pip install crcmod")
+            _crc64 = False
+    return _crc64
+
+
+def expected_checksum(headers, etag=None):
+    """
+    从响应头（以及列举得到的 ETag）中找出可以校验的值，返回 (算法, 期望值)，没有时返回 None。
+    优先使用 Content-MD5（Azure），其次是内容 MD5 形式的 ETag，最后是 OSS/COS 的 CRC64。
+    """
+    content_md5 = headers.get("Content-MD5")
+    if content_md5:
+        try:
+            return "md5", base64.b64decode(content_md5, validate=True).hex()
+        except ValueError:
+            pass
+
+    etag = (headers.get("ETag") or etag or "").strip('"')
+    encrypted = any(headers.get(name, "").upper() in ("AWS:KMS", "KMS") for name in _ENCRYPTION_HEADERS) or \
+        "x-amz-server-side-encryption-customer-algorithm" in headers
+    if MD5_ETAG.match(etag) and not encrypted:
+        return "md5", etag.lower()
+
+    for name in CRC64_HEADERS:
+        value = headers.get(name)
+        if value and value.isdigit() and _crc64_factory():
+            return "crc64", value
+    return None
+
+
+def available(algorithm: str) -> bool:
+    """本机能否计算该校验和（CRC64 需要 crcmod）。"""
+    return algorithm == "md5" or bool(_crc64_factory())
+
+
+def new_hash(algorithm: str):
+    return hashlib.md5() if algorithm == "md5" else _crc64_factory()()
+
+
+def digest_value(hash_object, algorithm: str) -> str:
+    return hash_object.hexdigest() if algorithm == "md5" else str(hash_object.crcValue)
+
+
+def file_checksum(path: str, algorithm: str, buffer_size: int, transfer=None) -> str:
+    """计算本地文件的校验和（分段下载完成后、--verify 时使用），传入 transfer 时累加进度。"""
+    return file_checksums(path, (algorithm,), buffer_size, transfer)[algorithm]
+
+
+def file_checksums(path: str, algorithms, buffer_size: int, transfer=None) -> dict:
+    """只读一遍本地文件，同时计算 algorithms 中的各个校验和，返回 {算法: 值}。"""
+    hashes = {algorithm: new_hash(algorithm) for algorithm in algorithms}
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            for hash_object in hashes.values():
+                hash_object.update(view[:count])
+            if transfer is not None:
+                transfer.bytes += count
+    return {algorithm: digest_value(hash_object, algorithm) for algorithm, hash_object in hashes.items()}
+
+
+class Digest:
+    """
+    一个对象的边下载边校验：下载线程把写出的数据块交给 update，由哈希线程按顺序计算；
+    finish 返回一个 Future，结果为校验和是否与期望值一致。
+    数据块不复制：读入缓冲区由 acquire 提供，哈希线程算完其中的数据后才归还，之前不会被覆盖。
+    """
+
+    def __init__(self, worker: queue.Queue, algorithm: str, expected: str) -> None:
+        self.worker = worker
+        self.algorithm = algorithm
+        self.expected = expected
+        self.hash = new_hash(algorithm)
+        self.future = Future()
+        self.free = queue.Queue()
+        self.buffers = 0
+
+    def acquire(self, buffer_size: int) -> memoryview:
+        """取一块读缓冲区；DIGEST_BUFFERS 块都在等待计算时等哈希线程归还一块。"""
+        if self.buffers < DIGEST_BUFFERS and self.free.empty():
+            self.buffers += 1
+            return memoryview(bytearray(buffer_size))
+        return memoryview(self.free.get())
+
+    def release(self, buffer: bytearray) -> None:
+        self.free.put(buffer)
+
+    def update(self, chunk, recycle: bool = False) -> None:
+        """
+        交出一个数据块（memoryview，不复制）。recycle 为真时 chunk 是 acquire 得到的缓冲区的切片，
+        由哈希线程算完后归还；否则调用方保证数据块之后不再被改写。
+        """
+        self.worker.put((self, chunk, recycle))
+
+    def finish(self) -> Future:
+        self.worker.put((self, None, False))
+        return self.future
+
+    def matches(self) -> bool:
+        return self.finish().result()
+
+
+class HashPool:
+    """HASH_THREADS 个哈希线程，每个对象固定交给其中一个，数据块按到达顺序计算。"""
+
+    def __init__(self, threads: int = HASH_THREADS) -> None:
+        self.workers = [queue.Queue(HASH_QUEUE_SIZE) for _ in range(threads)]
+        self.turn = itertools.cycle(self.workers)
+        for i, worker in enumerate(self.workers):
+            threading.Thread(target=self._run, args=(worker,), name=f"hash-{i}", daemon=True).start()
+
+    def digest(self, expected):
+        """expected 为 expected_checksum 的结果，为 None 时不校验，返回 None。"""
+        if expected is None:
+            return None
+        return Digest(next(self.turn), *expected)
+
+    @staticmethod
+    def _run(worker: queue.Queue) -> None:
+        while True:
+            digest, chunk, recycle = worker.get()
+            if chunk is not None:
+                digest.hash.update(chunk)
+                if recycle:
+                    digest.release(chunk.obj)
+            else:
+                digest.future.set_result(digest_value(digest.hash, digest.algorithm) == digest.expected)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_digest(headers):
+    """按响应头开始校验一个对象，没有可校验的值时返回 None。哈希线程在第一次用到时启动。"""
+    expected = expected_checksum(headers)
+    if expected is None:
+        return None
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashPool()
+    return _pool.digest(expected)
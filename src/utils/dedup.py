@@ -0,0 +1,103 @@
+import logging
+import os
+import shutil
+import threading
+
+from src.utils.layout import ensure_parent
+
+# claim 的返回值：相同内容正在由其他任务下载，完成后会调用登记的 waiter
+WAITING = object()
+
+
+def content_key(item):
+    """列举得到的 (ETag, 大小) 作为内容标识；没有 ETag 或空对象不参与去重。"""
+    if not item.etag or not item.size:
+        return None
+    return item.etag, item.size
+
+
+class _Entry:
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.done = False
+        self.waiters = []
+
+
+class DedupIndex:
+    """
+    本次运行内按 (ETag, 大小) 识别内容相同的对象，跨存储桶共享。
+    同一内容只由第一个认领的任务下载，其余对象在它完成后改为指向该文件的硬链接（文件系统不支持时复制），
+    不再发出 GET 也不重复占用磁盘；第一个任务下载失败时，等待中的对象重新认领，由其中一个重新下载。
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.linked = 0
+        self.copied = 0
+        self.saved_bytes = 0
+
+    def claim(self, item, local_path: str, waiter):
+        """
+        返回 None 表示由调用方下载（完成后必须调用 resolve）；返回源文件路径表示可直接链接；
+        返回 WAITING 表示相同内容正在下载，waiter 已登记，下载结束后会被无参调用，调用方应再次 claim。
+        """
+        key = content_key(item)
+        if key is None:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = _Entry(local_path)
+                return None
+            if entry.done:
+                return entry.source
+            entry.waiters.append(waiter)
+            return WAITING
+
+    def resolve(self, item, completed: bool) -> None:
+        """记录认领者的下载结果并唤醒等待者；失败时删除记录，让等待者重新认领。"""
+        key = content_key(item)
+        if key is None:
+            return
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            if completed:
+                entry.done = True
+            else:
+                del self.entries[key]
+            waiters, entry.waiters = entry.waiters, []
+
+        # 在锁外调用，waiter 可能需要获取调用方自己的锁
+        for waiter in waiters:
+            waiter()
+
+    def link(self, source: str, local_path: str, size: int) -> None:
+        """把 local_path 指向已下载的 source；跨文件系统等无法建立硬链接时复制。"""
+        ensure_parent(local_path)
+        linked = True
+        if not (os.path.exists(local_path) and os.path.samefile(source, local_path)):
+            if os.path.lexists(local_path):
+                os.remove(local_path)
+            try:
+                os.link(source, local_path)
+            except OSError:
+                shutil.copyfile(source, local_path)
+                linked = False
+
+        with self.lock:
+            if linked:
+                self.linked += 1
+            else:
+                self.copied += 1
+            self.saved_bytes += size
+
+    def log_summary(self) -> None:
+        if self.linked or self.copied:
+            logging.info(f"Deduplicated {self.linked + self.copied} files "
+                         f"({self.saved_bytes / (1024 * 1024):.2f} MB not downloaded): "
+                         f"{self.linked} hardlinked, {self.copied} copied")
@@ -1,35 +1,48 @@
+import hashlib
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor
-
-from tqdm import tqdm
-
-
-# 下载文件
-def download_files(bucket_handler, bucket_url, bucket_name, pbar: tqdm, thread_count: int) -> None:
-    keys = bucket_handler.list_objects()
-    if not keys:
-        logging.warning(f"[-] No files found in bucket {bucket_url}")
-        return
-
-    total_size = sum(size for _, size in keys)
-
-    # 定义更新进度条的函数
-    def update_progress(size: int) -> None:
-        pbar.update(size)
-
-    with ThreadPoolExecutor(max_workers=thread_count) as executor:
-        for key, size in keys:
-            local_path = os.path.join(f"./downloads/{bucket_name}", key)
-
-            # 提交下载任务，并传递回调以更新进度条
-            future = executor.submit(bucket_handler.download_object, key, local_path)
-            future.add_done_callback(lambda f: update_progress(size))
-
-    pbar.close()
+from typing import Iterable
+
+from src.utils.layout import flat_name
+from src.utils.manifest import DONE, FAILED
+from src.utils.sync import parse_last_modified
+
+
+def local_path_for(bucket_name: str, key: str, layout: str = "tree") -> str:
+    """
+    对象在本地的保存路径。tree 按键名保留目录结构；flat 把键名转义成单个文件名放在存储桶目录下；
+    hash 按键名的 SHA-1 分到两级共 65536 个子目录中，深层或海量的键名不会产生大量目录。
+    """
+    root = f"./downloads/{bucket_name}"
+    if layout == "tree":
+        return os.path.join(root, key)
+    if layout == "flat":
+        return os.path.join(root, flat_name(key))
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(root, digest[:2], digest[2:4], flat_name(key))
+
+
+def finish_download(item, local_path: str, manifest=None, succeeded: bool = True) -> bool:
+    """文件大小与列举结果一致才算完成；完成时把 mtime 对齐远端，并把结果写入清单。"""
+    try:
+        stat = os.stat(local_path) if succeeded else None
+    except OSError:
+        stat = None
+    completed = stat is not None and stat.st_size == item.size
+    if completed:
+        # 本地文件时间与远端 Last-Modified 对齐，供下次 --sync 比较；
+        # 去重的硬链接共用时间戳，取其中最新的 Last-Modified，各副本都不会被判为过期
+        remote_mtime = parse_last_modified(item.last_modified)
+        if remote_mtime is not None and stat.st_nlink > 1:
+            remote_mtime = max(remote_mtime, stat.st_mtime)
+        if remote_mtime is not None:
+            os.utime(local_path, (remote_mtime, remote_mtime))
+    if manifest is not None:
+        manifest.mark(item.key, DONE if completed else FAILED)
+    return completed
 
 # 记录文件数量、总大小和URL到日志文件
-def log_download_stats(file_count: int, total_size: int, file_urls: list, log_file: str) -> None:
+def log_download_stats(file_count: int, total_size: int, file_urls: Iterable[str], log_file: str) -> None:
     with open(log_file, 'w') as f:
         f.write(f"Total files: {file_count}\n")
         f.write(f"Total size: {total_size / (1024 * 1024):.2f} MB\n")
@@ -1,8 +1,13 @@
 import argparse
 import logging
 import signal
+import sys
 from typing import List
 
+from src.utils.layout import LAYOUTS
+from src.utils.selection import ORDERS, parse_size, parse_since
+from src.utils.shard import parse_shard
+
 
 def read_urls_from_file(file_path: str) -> List[str]:
     with open(file_path, 'r') as file:
@@ -29,7 +34,8 @@ def print_logo():
      |     Tool     |
      |______________|
     """
-    print(logo)
+    # 输出到标准错误，--sink tar/zip --output - 时标准输出只有归档内容
+    print(logo, file=sys.stderr)
 
 
 def parse_arguments():
@@ -38,6 +44,108 @@ def parse_arguments():
     parser.add_argument("-f", "--file", help="File containing bucket URLs")
     parser.add_argument("-p", "--proxy", help="Set global proxy (e.g., http://127.0.0.1:8080)")
     parser.add_argument("-t", "--threads", type=int, default=3, help="Number of threads to use for downloading")
+    parser.add_argument("-l", "--list-workers", type=int, default=1,
+                        help="Number of threads listing prefix/key-range partitions concurrently (default: 1, serial)")
+    parser.add_argument("-b", "--bucket-workers", type=int, default=4,
+                        help="Number of buckets listed and downloaded at the same time with -f (default: 4)")
+    parser.add_argument("--per-bucket", type=int, default=0,
+                        help="Max concurrent downloads from one bucket (default: 0, same as --threads)")
+    parser.add_argument("--per-endpoint", type=int, default=0,
+                        help="Max concurrent downloads against one service endpoint (default: 0, same as --threads)")
+    parser.add_argument("--retries", type=int, default=5,
+                        help="Retries for throttled (429/503), 5xx and timed-out requests (default: 5)")
+    parser.add_argument("--backoff", type=float, default=0.5,
+                        help="Base delay in seconds for jittered exponential backoff between retries (default: 0.5)")
+    parser.add_argument("--buffer-size", type=int, default=1024,
+                        help="Read buffer size in KB used when streaming objects to disk (default: 1024)")
+    parser.add_argument("--preallocate", action="store_true",
+                        help="Preallocate each file to the size reported by the listing before writing")
+    parser.add_argument("--multipart-threshold", type=int, default=64,
+                        help="Objects of at least this many MB are fetched as parallel byte ranges, 0 disables "
+                             "(default: 64)")
+    parser.add_argument("--part-size", type=int, default=16, help="Byte range size in MB for multi-part downloads "
+                                                                  "(default: 16)")
+    parser.add_argument("--part-workers", type=int, default=8,
+                        help="Threads fetching byte ranges of large objects, shared by all downloads (default: 8)")
+    parser.add_argument("--large-object", type=int, default=8,
+                        help="Objects of at least this many MB go to the large-object lane and start largest first "
+                             "(default: 8)")
+    parser.add_argument("--large-lane", type=int, default=0,
+                        help="Max download threads used by large objects while small ones are queued "
+                             "(default: 0, half of --threads)")
+    parser.add_argument("--straggler-after", type=float, default=10,
+                        help="Split a lagging single-stream download into parallel byte ranges once its estimated "
+                             "remaining time exceeds this many seconds, 0 disables (default: 10)")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                        help="I/O engine: 'threads' (requests + thread pool, default) or "
+                             "'async' (one asyncio event loop on httpx, optional dependency)")
+    parser.add_argument("--concurrency", type=int, default=256,
+                        help="Maximum concurrent requests/connections for --engine async (default: 256)")
+    parser.add_argument("--keepalive", type=float, default=5.0,
+                        help="Seconds an idle connection is kept alive for --engine async, 0 disables keep-alive "
+                             "(default: 5)")
+    parser.add_argument("--http2", action="store_true", help="Negotiate HTTP/2 with --engine async (needs httpx[http2])")
+    run_mode = parser.add_mutually_exclusive_group()
+    run_mode.add_argument("--resume", action="store_true",
+                          help="Resume an interrupted run from log/<module>/<bucket>/manifest.db "
+                               "(use the same -l as the interrupted run to reuse its listing cursors)")
+    run_mode.add_argument("--sync", action="store_true",
+                          help="Only download objects that are new or changed (size/ETag/Last-Modified) "
+                               "since the last run, compared with the manifest and ./downloads/<bucket>")
+    parser.add_argument("--report-deletions", action="store_true",
+                        help="With --sync, write objects deleted from the bucket to log/<module>/<bucket>/deleted.log")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Append one JSON line per request (dns/connect/tls/ttfb/body timings, bytes, status, retries) "
+                             "to FILE")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus-style metrics on http://127.0.0.1:PORT/metrics during the run")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Download objects with the same ETag and size only once per run (across buckets) and "
+                             "hardlink the duplicates")
+    parser.add_argument("--sink", choices=["fs", "tar", "zip", "minio"], default="fs",
+                        help="Where downloaded objects go: fs (one file per object under ./downloads, default), "
+                             "tar/zip (one streaming archive, see --output) or minio (PUT to a MinIO-compatible bucket)")
+    parser.add_argument("--output", help="Archive path for --sink tar/zip (default: downloads.tar / downloads.zip, "
+                                         "'-' for stdout) or bucket URL for --sink minio (e.g. http://127.0.0.1:9000/backup)")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="MB of small objects coalesced into one sequential archive write or one MinIO upload "
+                             "(default: 8)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="tree",
+                        help="Local file layout for --sink fs: tree (mirror the key paths, default), flat (one "
+                             "escaped file name per key) or hash (two levels of SHA-1 fan-out directories)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Recheck files already downloaded (per the manifest) against their MD5/CRC64 checksums "
+                             "without downloading them; mismatches are marked for --resume")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="Handle only shard I of N (1-based) of every bucket, so N processes or machines can "
+                             "split the listing and downloads without overlap (the split does not depend on -l or "
+                             "--engine); logs go to log/<module>/<bucket>/shard-I-of-N")
+    parser.add_argument("--merge-shards", action="store_true",
+                        help="Merge the per-shard manifests and logs of finished --shard runs into "
+                             "log/<module>/<bucket> and report duplicate objects and missing or unfinished shards, "
+                             "download nothing")
+    parser.add_argument("--list-only", action="store_true",
+                        help="Only list the buckets: write each listing to log/<module>/<bucket>/inventory.* with a "
+                             "size histogram and per-prefix/extension/storage class totals, download nothing")
+    parser.add_argument("--inventory-format", choices=("jsonl", "csv", "parquet"), default="jsonl",
+                        help="Inventory format for --list-only: jsonl (gzip, default), csv (gzip) or parquet "
+                             "(requires pyarrow)")
+    parser.add_argument("--prefix", help="Only list objects under this key prefix")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="Only download keys matching this glob, e.g. '*.jpg' (repeatable)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="Skip keys matching this glob (repeatable)")
+    parser.add_argument("--regex", help="Only download keys matching this regular expression")
+    parser.add_argument("--min-size", type=parse_size, help="Skip objects smaller than this size (e.g. 10K, 1.5M)")
+    parser.add_argument("--max-size", type=parse_size, help="Skip objects larger than this size (e.g. 100M, 2G)")
+    parser.add_argument("--modified-since", type=parse_since, metavar="DATE",
+                        help="Skip objects last modified before this ISO date/time (e.g. 2024-01-31)")
+    parser.add_argument("--max-bytes", type=parse_size,
+                        help="Byte budget per bucket; objects that no longer fit are skipped (e.g. 5G). With --resume, "
+                             "objects already in the manifest count against it")
+    parser.add_argument("--order", choices=ORDERS, default="listing",
+                        help="Order in which --max-bytes picks objects: listing (streaming, default), smallest "
+                             "or newest first (waits for the full listing)")
 
     # 定义支持的模块和描述
     module_help = {
@@ -65,6 +173,19 @@ def parse_arguments():
         parser.error("Either -u (URL) or -f (file) must be provided.")
     if not args.module:
         parser.error("The -m (module) parameter is required.")
+    if args.sink == "minio" and not args.output:
+        parser.error("--sink minio requires --output with the target bucket URL.")
+    if args.dedup and args.sink != "fs":
+        parser.error("--dedup hardlinks local files and only works with --sink fs.")
+    if args.layout != "tree" and args.sink != "fs":
+        parser.error("--layout only applies to local files (--sink fs).")
+    if args.verify and (args.sink != "fs" or args.resume or args.sync):
+        parser.error("--verify rechecks local files (--sink fs) and cannot be combined with --resume or --sync.")
+    if args.merge_shards and (args.shard or args.verify or args.list_only or args.resume or args.sync):
+        parser.error("--merge-shards only merges logs and cannot be combined with --shard, --verify, --list-only, "
+                     "--resume or --sync.")
+    if args.list_only and (args.verify or args.resume or args.sync or args.dedup):
+        parser.error("--list-only downloads nothing and cannot be combined with --verify, --resume, --sync or --dedup.")
 
     # 检查模块有效性
     valid_modules = module_help.keys()
@@ -0,0 +1,258 @@
+import bisect
+import csv
+import gzip
+import importlib.util
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from src.handlers import BucketFactory
+from src.utils.bucket_handler import prepare_bucket
+from src.utils.retry import RetryPolicy
+from src.utils.scheduler import endpoint_of
+from src.utils.selection import Selection
+
+FIELDS = ("key", "size", "etag", "last_modified", "storage_class")
+
+# 直方图各区间的上界（字节），最后一个区间不设上界
+SIZE_EDGES = (0, 1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20, 64 << 20,
+              256 << 20, 1 << 30, 4 << 30)
+
+# 每种统计最多保留的名称数，超过时合并对象数最少的一半，内存不随键数增长
+TALLY_LIMIT = 10000
+
+# 日志中列出的前缀和扩展名个数，摘要文件中保留的个数
+TOP_LOGGED = 10
+TOP_SAVED = 100
+
+# Parquet 每个行组的行数，写满一组才落盘
+PARQUET_ROW_GROUP = 100000
+
+
+def _format_size(size: int) -> str:
+    return tqdm.format_sizeof(size, "B", 1024)
+
+
+class _Tally:
+    """按名称累计对象数和字节数。名称数超过上限时把对象数最少的一半并入 (other)，排在前面的结果是近似值。"""
+
+    def __init__(self, limit: int = TALLY_LIMIT) -> None:
+        self.limit = limit
+        self.entries = {}
+        self.other = [0, 0]
+        self.approximate = False
+
+    def add(self, name: str, size: int) -> None:
+        entry = self.entries.get(name)
+        if entry is None:
+            if len(self.entries) >= self.limit:
+                self._prune()
+            entry = self.entries[name] = [0, 0]
+        entry[0] += 1
+        entry[1] += size
+
+    def _prune(self) -> None:
+        ranked = sorted(self.entries, key=lambda name: self.entries[name][0])
+        for name in ranked[:len(ranked) // 2]:
+            count, size = self.entries.pop(name)
+            self.other[0] += count
+            self.other[1] += size
+        self.approximate = True
+
+    def top(self, count: int):
+        """按字节数从大到小返回前 count 个 (名称, 对象数, 字节数)。"""
+        ranked = sorted(self.entries.items(), key=lambda entry: entry[1][1], reverse=True)[:count]
+        return [(name, objects, size) for name, (objects, size) in ranked]
+
+
+class InventoryStats:
+    """与导出同一遍计算的统计：大小直方图、一级前缀、扩展名和存储类别。"""
+
+    def __init__(self) -> None:
+        self.objects = 0
+        self.bytes = 0
+        self.histogram = [[0, 0] for _ in range(len(SIZE_EDGES) + 1)]
+        self.prefixes = _Tally()
+        self.extensions = _Tally()
+        self.storage_classes = _Tally()
+
+    def add_page(self, keys) -> None:
+        for item in keys:
+            size = item.size
+            self.objects += 1
+            self.bytes += size
+            slot = self.histogram[bisect.bisect_left(SIZE_EDGES, size)]
+            slot[0] += 1
+            slot[1] += size
+
+            key = item.key
+            slash = key.find("/")
+            self.prefixes.add(key[:slash + 1] if slash >= 0 else "(root)", size)
+            name = key[key.rfind("/") + 1:]
+            dot = name.rfind(".")
+            self.extensions.add(name[dot:].lower() if dot > 0 else "(none)", size)
+            self.storage_classes.add(item.storage_class or "(unknown)", size)
+
+    def histogram_rows(self):
+        """返回 (区间说明, 对象数, 字节数)，跳过空区间。"""
+        rows = []
+        for i, (count, size) in enumerate(self.histogram):
+            if not count:
+                continue
+            if i == 0:
+                label = "0 B"
+            elif i == len(SIZE_EDGES):
+                label = f"> {_format_size(SIZE_EDGES[-1])}"
+            else:
+                label = f"{_format_size(SIZE_EDGES[i - 1])} - {_format_size(SIZE_EDGES[i])}"
+            rows.append((label, count, size))
+        return rows
+
+    def to_dict(self) -> dict:
+        def tally(values: _Tally):
+            entries = [{"name": name, "objects": objects, "bytes": size}
+                       for name, objects, size in values.top(TOP_SAVED)]
+            return {"top": entries, "other": {"objects": values.other[0], "bytes": values.other[1]},
+                    "approximate": values.approximate}
+
+        return {
+            "objects": self.objects,
+            "bytes": self.bytes,
+            "size_histogram": [{"range": label, "objects": count, "bytes": size}
+                               for label, count, size in self.histogram_rows()],
+            "prefixes": tally(self.prefixes),
+            "extensions": tally(self.extensions),
+            "storage_classes": tally(self.storage_classes),
+        }
+
+    def log(self, bucket_name: str) -> None:
+        logging.info(f"Bucket: {bucket_name}")
+        logging.info(f"Total files: {self.objects}")
+        logging.info(f"Total size: {self.bytes / (1024 * 1024):.2f} MB")
+        logging.info("Size histogram: " + ", ".join(f"{label}: {count}" for label, count, _ in self.histogram_rows()))
+        for title, values in (("Top prefixes", self.prefixes), ("Extensions", self.extensions),
+                              ("Storage classes", self.storage_classes)):
+            top = values.top(TOP_LOGGED)
+            logging.info(f"{title}: " + ", ".join(f"{name} {objects} ({_format_size(size)})"
+                                                  for name, objects, size in top))
+
+
+class _JsonLinesWriter:
+    def __init__(self, path: str) -> None:
+        self.file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+
+    def write_page(self, keys) -> None:
+        self.file.writelines(json.dumps(dict(zip(FIELDS, item)), ensure_ascii=False) + "\n" for item in keys)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _CsvWriter:
+    def __init__(self, path: str) -> None:
+        self.file = gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+
+    def write_page(self, keys) -> None:
+        self.writer.writerows(keys)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ParquetWriter:
+    """Parquet 输出依赖可选的 pyarrow，逐个行组写出，内存中最多保留一个行组。"""
+
+    def __init__(self, path: str) -> None:
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([("key", pyarrow.string()), ("size", pyarrow.int64()),
+                                      ("etag", pyarrow.string()), ("last_modified", pyarrow.string()),
+                                      ("storage_class", pyarrow.string())])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        self.rows = []
+
+    def write_page(self, keys) -> None:
+        self.rows.extend(keys)
+        if len(self.rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.rows:
+            columns = list(zip(*self.rows))
+            self.writer.write_table(self.pyarrow.table(
+                [self.pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema))
+            self.rows = []
+
+    def close(self) -> None:
+        self._flush()
+        self.writer.close()
+
+
+_WRITERS = {"jsonl": ("jsonl.gz", _JsonLinesWriter), "csv": ("csv.gz", _CsvWriter),
+            "parquet": ("parquet", _ParquetWriter)}
+
+
+def export_inventories(bucket_urls, session, args, metrics=None) -> None:
+    """
+    --list-only：只列举不下载，把每个存储桶的对象清单边列举边写入 log/<module>/<bucket>/inventory.*，
+    同一遍统计大小直方图、一级前缀、扩展名和存储类别（写入 inventory-summary.json 并输出到日志）。
+    每次只在内存中保留一页列举结果，千万级对象的存储桶也不会占用更多内存。
+    """
+    if args.inventory_format == "parquet":
+        if importlib.util.find_spec("pyarrow") is None:
+            logging.error("Parquet inventories require pyarrow. Install it with: pip install pyarrow")
+            return
+
+    retry_policy = RetryPolicy(args.retries, args.backoff)
+    with tqdm(total=0, unit=" objects", unit_scale=True, desc="Listing") as pbar, \
+            ThreadPoolExecutor(max_workers=args.bucket_workers, thread_name_prefix="inventory") as executor:
+        for future in [executor.submit(_export_bucket, bucket_url, session, args, metrics, retry_policy, pbar)
+                       for bucket_url in bucket_urls]:
+            future.result()
+
+
+def _export_bucket(bucket_url, session, args, metrics, retry_policy, pbar) -> None:
+    bucket_name, log_dir = prepare_bucket(bucket_url, args.module, args.shard)
+    if log_dir is None:
+        return
+
+    suffix, writer_class = _WRITERS[args.inventory_format]
+    path = os.path.join(log_dir, f"inventory.{suffix}")
+    stats = InventoryStats()
+    selection = Selection.from_args(args)
+    try:
+        bucket_handler = BucketFactory.get_handler(bucket_url, session, args.module)
+        bucket_handler.set_retry_options(retry_policy)
+        bucket_handler.set_metrics(metrics, bucket_name, endpoint_of(bucket_url, bucket_name))
+        writer = writer_class(path)
+        try:
+            for keys in bucket_handler.list_objects_parallel(args.list_workers, args.prefix, shard=args.shard):
+                # 只应用筛选条件，--max-bytes 预算只用于下载
+                if selection.filtering:
+                    keys = [item for item in keys if selection.matches(item)]
+                writer.write_page(keys)
+                stats.add_page(keys)
+                with pbar.get_lock():
+                    pbar.total += len(keys)
+                    pbar.update(len(keys))
+        finally:
+            writer.close()
+    except Exception as e:
+        logging.error(f"An error occurred while listing {bucket_url}: {str(e)}")
+        return
+
+    if bucket_handler.list_errors:
+        logging.warning(f"Inventory of {bucket_url} is incomplete ({bucket_handler.list_errors} pages failed "
+                        f"after retries).")
+    with open(os.path.join(log_dir, "inventory-summary.json"), "w") as f:
+        json.dump(stats.to_dict(), f, ensure_ascii=False, indent=2)
+    stats.log(bucket_name)
+    logging.info(f"Inventory written to {path}")
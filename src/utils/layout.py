@@ -0,0 +1,58 @@
+import hashlib
+import os
+import threading
+
+# 本地文件的目录布局：tree 按键名保留目录结构（默认），flat 每个存储桶一层，hash 按键名哈希分成两级目录
+LAYOUTS = ("tree", "flat", "hash")
+
+# 常见文件系统的文件名上限（字节）
+MAX_NAME = 255
+
+
+def flat_name(key: str) -> str:
+    """flat、hash 布局的文件名：把键名转成单个文件名：% 和 / 转义为 %25、%2F，可以用 urllib.parse.unquote 还原；超过文件名上限时截断并附上键名的哈希。"""
+    name = key.replace("%", "%25").replace("/", "%2F")
+    if name in ("", ".", ".."):
+        name = name.replace(".", "%2E") or "%00"
+    if len(name.encode('utf-8')) > MAX_NAME:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        name = name.encode('utf-8')[:MAX_NAME - len(digest) - 1].decode('utf-8', 'ignore') + "~" + digest
+    return name
+
+
+class DirectoryCache:
+    """
+    已创建目录的缓存，所有下载线程共用：同一目录只调用一次 os.makedirs，之后的对象不再发出 stat/mkdir。
+    目录在运行中被外部删除时，调用方用 forget 清除记录后重新创建。
+    """
+
+    def __init__(self) -> None:
+        self.created = set()
+        self.lock = threading.Lock()
+
+    def ensure(self, directory: str) -> None:
+        if not directory or directory in self.created:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            # 父目录随之存在，一并记下
+            while directory and directory not in self.created:
+                self.created.add(directory)
+                directory = os.path.dirname(directory)
+
+    def ensure_all(self, directories) -> None:
+        """按路径排序后依次创建，父目录先于子目录，创建子目录时不再逐级检查。"""
+        for directory in sorted(set(directories) - self.created):
+            self.ensure(directory)
+
+    def forget(self, directory: str) -> None:
+        with self.lock:
+            self.created = {path for path in self.created
+                            if path != directory and not path.startswith(directory + os.sep)}
+
+
+directories = DirectoryCache()
+
+
+def ensure_parent(path: str) -> None:
+    directories.ensure(os.path.dirname(path))
@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import threading
+from typing import Iterator, List
+
+from src.handlers.base import ObjectInfo
+
+# 对象下载状态
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+# 单条 SQL 中 IN (...) 的参数个数上限
+_BATCH = 900
+
+
+class Manifest:
+    """
+    每个存储桶一份的 SQLite 清单（log/<module>/<bucket>/manifest.db）。
+    记录各列举分区的游标，以及每个对象的大小、ETag/Last-Modified 和下载状态，
+    中断后用 --resume 重新运行即可从游标处继续列举，并跳过已完成的对象。
+    --sync 时清单作为上次运行的索引：重新完整列举，只下载新增或变化的对象，
+    每个对象记录最后一次被列举到的运行序号（seen），据此找出远端已删除的对象。
+    """
+
+    def __init__(self, path: str, resume: bool = False, sync: bool = False) -> None:
+        if not resume and not sync:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+        self.path = path
+        self.resumed = resume
+        self.synced = sync
+        self.lock = threading.Lock()
+        self.finished = []  # 待写入的 (state, key)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS objects ("
+                          "key TEXT PRIMARY KEY, size INTEGER, etag TEXT, last_modified TEXT, state INTEGER, "
+                          "seen INTEGER DEFAULT 0)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cursors ("
+                          "partition TEXT PRIMARY KEY, marker TEXT, done INTEGER)")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(objects)")]
+        if "seen" not in columns:
+            self.conn.execute("ALTER TABLE objects ADD COLUMN seen INTEGER DEFAULT 0")
+
+        self.run_id = self.conn.execute("SELECT COALESCE(MAX(seen), 0) + 1 FROM objects").fetchone()[0]
+        if sync:
+            # 同步需要重新完整列举，旧游标作废
+            self.conn.execute("DELETE FROM cursors")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # 列举游标
+    def cursor(self, partition: str):
+        """返回 (marker, done)，分区从未列举过时返回 None。"""
+        with self.lock:
+            row = self.conn.execute("SELECT marker, done FROM cursors WHERE partition = ?", (partition,)).fetchone()
+        return None if row is None else (row[0], bool(row[1]))
+
+    def save_cursor(self, partition: str, marker) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO cursors VALUES (?, ?, ?)",
+                              (partition, marker, int(marker is None)))
+            self._flush()
+            self.conn.commit()
+
+    # 对象记录
+    def record_page(self, objects: List[ObjectInfo], is_current=None, select=None) -> List[ObjectInfo]:
+        """
+        记录一页列举结果，返回本次需要下载的对象。
+        续传时跳过清单里已有且大小、ETag、Last-Modified 未变的对象：已完成的无需再下，未完成的由 pending_objects 补上。
+        同步时只跳过未变且已下载完成的对象；is_current(item) 用于确认本地副本仍然有效，
+        对清单中没有记录的对象，本地副本有效时也直接视为已完成。
+        select(objects) 在跳过之后再筛选剩下的对象，被跳过的对象因此不会占用字节预算。
+        """
+        if not objects:
+            return objects
+
+        with self.lock:
+            skipped = []
+            if self.resumed or self.synced:
+                known = {}
+                for i in range(0, len(objects), _BATCH):
+                    batch = [item.key for item in objects[i:i + _BATCH]]
+                    rows = self.conn.execute(
+                        "SELECT key, size, etag, last_modified, state FROM objects "
+                        f"WHERE key IN ({','.join('?' * len(batch))})", batch)
+                    known.update((row[0], row[1:]) for row in rows)
+
+                selected = []
+                for item in objects:
+                    record = known.get(item.key)
+                    if self.resumed:
+                        unchanged = record is not None and record[:3] == item[1:4]
+                    elif record is None:
+                        unchanged = is_current is not None and is_current(item)
+                    else:
+                        unchanged = record[:3] == item[1:4] and record[3] == DONE \
+                            and (is_current is None or is_current(item))
+                    (skipped if unchanged else selected).append(item)
+                objects = selected
+            if select is not None:
+                objects = select(objects)
+
+            self.conn.executemany(
+                "INSERT INTO objects VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "size = excluded.size, etag = excluded.etag, last_modified = excluded.last_modified, "
+                "state = excluded.state, seen = excluded.seen",
+                [(item.key, item.size, item.etag, item.last_modified, PENDING, self.run_id) for item in objects])
+            if self.synced:
+                self.conn.executemany(
+                    "INSERT INTO objects VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET seen = excluded.seen",
+                    [(item.key, item.size, item.etag, item.last_modified, DONE, self.run_id) for item in skipped])
+            self.conn.commit()
+        return objects
+
+    def mark(self, key: str, state: int) -> None:
+        """记录对象的下载结果（可在下载线程中调用，批量写入）。"""
+        with self.lock:
+            self.finished.append((state, key))
+            if len(self.finished) >= _BATCH:
+                self._flush()
+                self.conn.commit()
+
+    def _flush(self) -> None:
+        if self.finished:
+            self.conn.executemany("UPDATE objects SET state = ? WHERE key = ?", self.finished)
+            self.finished = []
+
+    def merge(self, path: str) -> int:
+        """
+        并入另一份清单（--merge-shards 合并各分片的清单）：对象按键覆盖写入，返回并入前本清单中已有的对象数，
+        即被多个分片重复记录的对象。分区游标不并入：各分片只列举了自己的分区，合并后的清单
+        不能把整个存储桶当作已列举完，之后 --resume 时重新列举，已完成的对象按清单跳过。
+        """
+        with self.lock:
+            self._flush()
+            self.conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                duplicates = self.conn.execute(
+                    "SELECT COUNT(*) FROM shard.objects WHERE key IN (SELECT key FROM main.objects)").fetchone()[0]
+                self.conn.execute("INSERT OR REPLACE INTO objects (key, size, etag, last_modified, state, seen) "
+                                  "SELECT key, size, etag, last_modified, state, seen FROM shard.objects")
+                self.conn.commit()
+            finally:
+                self.conn.execute("DETACH DATABASE shard")
+            self.run_id = self.conn.execute("SELECT COALESCE(MAX(seen), 0) + 1 FROM objects").fetchone()[0]
+        return duplicates
+
+    def summary(self):
+        """返回清单中的 (文件数, 总大小)。"""
+        with self.lock:
+            count, total_size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return count, total_size
+
+    def failed_count(self) -> int:
+        """返回下载失败（重试用尽）的对象数。"""
+        with self.lock:
+            self._flush()
+            return self.conn.execute("SELECT COUNT(*) FROM objects WHERE state = ?", (FAILED,)).fetchone()[0]
+
+    def deleted_objects(self, page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        """同步时按页返回本次列举中没有出现、即远端已删除的对象。"""
+        yield from self._iter_pages(f"WHERE seen < {self.run_id}", page_size)
+
+    def forget_deleted(self) -> None:
+        """从清单中移除远端已删除的对象。"""
+        with self.lock:
+            self.conn.execute("DELETE FROM objects WHERE seen < ?", (self.run_id,))
+            self.conn.commit()
+
+    def pending_objects(self, page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        """按页返回上次已列举但尚未下载完成的对象。"""
+        yield from self._iter_pages(f"WHERE state != {DONE}", page_size)
+
+    def done_objects(self, page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        """按页返回已下载完成的对象（--verify 核对这些本地文件）。"""
+        yield from self._iter_pages(f"WHERE state = {DONE}", page_size)
+
+    def iter_objects(self, page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        """按键顺序分页返回清单中的全部对象。"""
+        yield from self._iter_pages("", page_size)
+
+    def _iter_pages(self, where: str, page_size: int) -> Iterator[List[ObjectInfo]]:
+        last_key = ""
+        while True:
+            clause = f"{where} AND key > ?" if where else "WHERE key > ?"
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT key, size, etag, last_modified FROM objects {clause} ORDER BY key LIMIT ?",
+                    (last_key, page_size)).fetchall()
+            if not rows:
+                break
+            yield [ObjectInfo(*row) for row in rows]
+            last_key = rows[-1][0]
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            self.conn.commit()
+            self.conn.close()
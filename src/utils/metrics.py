@@ -0,0 +1,291 @@
+import json
+import logging
+import threading
+import time
+
+# 耗时直方图的桶上界（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 请求的各阶段：DNS 解析、TCP 握手、TLS 握手、首字节、响应体、下载任务在线程池中的排队时间
+PHASES = ("dns", "connect", "tls", "ttfb", "body", "queue")
+# 由 RequestTrace 计时的阶段（排队时间单独记录）
+_TRACED = PHASES[:-1]
+
+# 新建连接的耗时由 transport 中的连接类写入当前线程，请求返回时由 RequestTrace 取走
+_local = threading.local()
+
+
+def note_connect(dns: float, connect: float, tls: float) -> None:
+    _local.dns = getattr(_local, "dns", 0.0) + dns
+    _local.connect = getattr(_local, "connect", 0.0) + connect
+    _local.tls = getattr(_local, "tls", 0.0) + tls
+
+
+def _take_connect():
+    dns, connect, tls = getattr(_local, "dns", 0.0), getattr(_local, "connect", 0.0), getattr(_local, "tls", 0.0)
+    _local.dns = _local.connect = _local.tls = 0.0
+    return dns, connect, tls
+
+
+class Histogram:
+    """Prometheus 风格的累积直方图。"""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估计分位数。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class _Series:
+    """一组标签（请求类型、存储桶、端点）下的累计值。"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.status = {}
+        self.duration = Histogram()
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+
+class RequestTrace:
+    """
+    一次逻辑请求（一页列举、一个对象或一个分段）的计时，包括其中的全部重试。
+    metrics 为 None 时只做几次计时，不记录任何数据。
+    """
+
+    def __init__(self, metrics, kind: str, labels) -> None:
+        self.metrics = metrics
+        self.kind = kind
+        self.bucket, self.endpoint = labels
+        self.status = None
+        self.error = None
+        self.retries = 0
+        self.bytes = 0
+        self.dns = self.connect = self.tls = self.ttfb = self.body = 0.0
+        self.start = self.sent_at = self.received_at = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_value is not None and self.error is None:
+            self.error = repr(exc_value)
+        if self.metrics is not None:
+            self.metrics.finish(self, time.perf_counter() - self.start)
+
+    def sent(self) -> None:
+        """发送（或重新发送）请求前调用，只统计最后一次尝试的各阶段耗时。"""
+        self.sent_at = time.perf_counter()
+        _take_connect()
+
+    def received(self, response) -> None:
+        """收到响应后调用。非流式请求返回时响应体已读完，响应头到达的时刻取自 response.elapsed。"""
+        now = time.perf_counter()
+        try:
+            headers = response.elapsed.total_seconds()
+        except (AttributeError, RuntimeError):
+            headers = now - self.sent_at
+        self.received_at = self.sent_at + headers
+        self.status = response.status_code
+        self.error = None
+        self.dns, self.connect, self.tls = _take_connect()
+        self.ttfb = max(headers - self.dns - self.connect - self.tls, 0.0)
+
+    def read(self, count: int) -> None:
+        """响应体读完后调用。"""
+        self.bytes += count
+        self.body = time.perf_counter() - self.received_at
+
+
+class Metrics:
+    """
+    请求级指标：每个请求的各阶段耗时、字节数、状态码和重试次数，按 (类型, 存储桶, 端点) 汇总为直方图。
+    可以逐条写入 JSON-lines 文件，或以 Prometheus 文本格式在 HTTP 端口上提供，运行结束时输出汇总表。
+    """
+
+    def __init__(self, jsonl_path: str = None) -> None:
+        self.lock = threading.Lock()
+        self.series = {}
+        self.jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self.server = None
+
+    def _series(self, kind: str, bucket: str, endpoint: str) -> _Series:
+        key = (kind, bucket, endpoint)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series()
+        return series
+
+    def finish(self, trace: RequestTrace, duration: float) -> None:
+        failed = trace.error is not None or trace.status is None or trace.status >= 400
+        with self.lock:
+            series = self._series(trace.kind, trace.bucket, trace.endpoint)
+            series.requests += 1
+            series.errors += failed
+            series.retries += trace.retries
+            series.bytes += trace.bytes
+            status = trace.status or "error"
+            series.status[status] = series.status.get(status, 0) + 1
+            series.duration.observe(duration)
+            for phase in _TRACED:
+                series.phases[phase].observe(getattr(trace, phase))
+
+            if self.jsonl is not None:
+                record = {"time": round(time.time(), 3), "kind": trace.kind, "bucket": trace.bucket,
+                          "endpoint": trace.endpoint, "status": trace.status, "bytes": trace.bytes,
+                          "retries": trace.retries, "duration": round(duration, 6)}
+                record.update((phase, round(getattr(trace, phase), 6)) for phase in _TRACED)
+                if trace.error is not None:
+                    record["error"] = trace.error
+                self.jsonl.write(json.dumps(record) + "\n")
+
+    def observe_queue(self, labels, wait: float) -> None:
+        """记录下载任务从提交到开始执行的排队时间。"""
+        with self.lock:
+            self._series("get", *labels).phases["queue"].observe(wait)
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP bucket_tool_{name} {help_text}")
+            lines.append(f"# TYPE bucket_tool_{name} {kind}")
+
+        with self.lock:
+            items = sorted(self.series.items())
+
+            metric("requests_total", "counter", "Requests by kind, bucket, endpoint and status.")
+            for (kind, bucket, endpoint), series in items:
+                for status, count in sorted(series.status.items(), key=str):
+                    lines.append(f'bucket_tool_requests_total{{{_labels(kind, bucket, endpoint)},status="{status}"}} '
+                                 f'{count}')
+            for name, field, help_text in (("retries_total", "retries", "Retried attempts."),
+                                           ("bytes_total", "bytes", "Response body bytes received.")):
+                metric(name, "counter", help_text)
+                for (kind, bucket, endpoint), series in items:
+                    lines.append(f"bucket_tool_{name}{{{_labels(kind, bucket, endpoint)}}} {getattr(series, field)}")
+
+            metric("request_duration_seconds", "histogram", "Wall time per request including retries.")
+            for (kind, bucket, endpoint), series in items:
+                _histogram_lines(lines, "request_duration_seconds", _labels(kind, bucket, endpoint), series.duration)
+            metric("phase_seconds", "histogram", "Time spent in dns, connect, tls, ttfb, body and queue phases.")
+            for (kind, bucket, endpoint), series in items:
+                for phase, histogram in series.phases.items():
+                    if histogram.count:
+                        _histogram_lines(lines, "phase_seconds",
+                                         f'{_labels(kind, bucket, endpoint)},phase="{phase}"', histogram)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int) -> None:
+        """在后台线程中以 Prometheus 文本格式提供 /metrics。"""
+        # 只有指定 --metrics-port 时才需要 HTTP 服务，不在启动时导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Serving metrics at http://127.0.0.1:{port}/metrics")
+
+    def log_summary(self) -> None:
+        """按请求类型和端点输出汇总表。"""
+        with self.lock:
+            rows = {}
+            for (kind, _, endpoint), series in self.series.items():
+                rows.setdefault((kind, endpoint), []).append(series)
+        if not rows:
+            return
+
+        header = (f"{'kind':<6} {'endpoint':<32} {'reqs':>7} {'errors':>6} {'retries':>7} {'MB':>9} "
+                  f"{'p50':>7} {'p95':>7} {'dns':>7} {'connect':>8} {'tls':>7} {'ttfb':>7} {'body':>7} {'queue':>7}")
+        logging.info("Request metrics (p50/p95 from histogram buckets, phase columns are means in ms):")
+        logging.info(header)
+        for (kind, endpoint), group in sorted(rows.items()):
+            merged = _merge(group)
+            means = [merged.phases[phase].sum / merged.phases[phase].count * 1000 if merged.phases[phase].count
+                     else 0.0 for phase in PHASES]
+            logging.info(f"{kind:<6} {endpoint[:32]:<32} {merged.requests:>7} {merged.errors:>6} {merged.retries:>7} "
+                         f"{merged.bytes / (1024 * 1024):>9.2f} {_seconds(merged.duration.quantile(0.5)):>7} "
+                         f"{_seconds(merged.duration.quantile(0.95)):>7} "
+                         + " ".join(f"{mean:>{width}.1f}" for mean, width in zip(means, (7, 8, 7, 7, 7, 7))))
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+        if self.jsonl is not None:
+            self.jsonl.close()
+            self.jsonl = None
+
+
+def _labels(kind: str, bucket: str, endpoint: str) -> str:
+    return f'kind="{kind}",bucket="{_escape(bucket)}",endpoint="{_escape(endpoint)}"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(lines, name: str, labels: str, histogram: Histogram) -> None:
+    cumulative = 0
+    for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+        cumulative += count
+        lines.append(f'bucket_tool_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"bucket_tool_{name}_sum{{{labels}}} {histogram.sum:.6f}")
+    lines.append(f"bucket_tool_{name}_count{{{labels}}} {histogram.count}")
+
+
+def _merge(group) -> _Series:
+    merged = _Series()
+    for series in group:
+        merged.requests += series.requests
+        merged.errors += series.errors
+        merged.retries += series.retries
+        merged.bytes += series.bytes
+        for source, target in zip([series.duration] + list(series.phases.values()),
+                                  [merged.duration] + list(merged.phases.values())):
+            target.counts = [a + b for a, b in zip(target.counts, source.counts)]
+            target.sum += source.sum
+            target.count += source.count
+    return merged
+
+
+def _seconds(value: float) -> str:
+    return ">30s" if value == float("inf") else f"{value:g}s"
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import struct
+import tempfile
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from src.handlers.base import ObjectInfo
+from src.utils.sync import parse_last_modified
+
+# 默认内存预算
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# 每个对象在五个 array('q') 列（键名、ETag、Last-Modified 的偏移量，大小，修改时间）和存储类别编号列上的固定开销
+_FIXED_BYTES = 5 * 8 + 2
+
+# 分段头：对象数、键名字节数、ETag 字节数、Last-Modified 字节数
+_SEGMENT_HEADER = struct.Struct("<qqqq")
+
+# 分段读回后各列的顺序
+_COLUMNS = ("keys", "key_ends", "sizes", "mtimes", "etags", "etag_ends", "modified", "modified_ends", "classes")
+
+
+class ObjectIndex:
+    """
+    列举结果的列式索引，代替逐个对象的 Python 元组。
+    键名按 UTF-8 连续存放在一个 bytearray 中，用 array('q') 记录结束偏移量；大小、修改时间（毫秒，未知为 -1，用于排序）
+    各占一列 array('q')，ETag 和原始的 Last-Modified 文本同样连续存放；存储类别只有少数几种，每个对象记一个编号（array('h')，
+    0 表示未知），名称表常驻内存。遍历得到的 ObjectInfo 与追加时完全一致。
+    内存中的数据超过 memory_budget 字节时整体写入临时文件的一个分段，遍历时先依次读回各分段再遍历内存中的部分，
+    千万级对象也只占用可预期的内存。
+    目前用于排序选择（Selection）暂存列举结果；下载统计直接从清单（SQLite）计算，--list-only 的统计边列举边累计。
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, spill_dir: str = None) -> None:
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.spill_file = None
+        self.spilled = 0
+
+        self.count = 0
+        # 存储类别编号 -> 名称，编号 0 留给未知
+        self.class_names: List[str] = [None]
+        self.class_codes: Dict[str, int] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        self.keys = bytearray()
+        self.key_ends = array('q')
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.etags = bytearray()
+        self.etag_ends = array('q')
+        self.modified = bytearray()
+        self.modified_ends = array('q')
+        self.classes = array('h')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.keys) + len(self.etags) + len(self.modified) + len(self.sizes) * _FIXED_BYTES
+
+    def append(self, item: ObjectInfo) -> None:
+        self.keys += item.key.encode('utf-8')
+        self.key_ends.append(len(self.keys))
+        self.sizes.append(item.size)
+        mtime = parse_last_modified(item.last_modified)
+        self.mtimes.append(-1 if mtime is None else int(mtime * 1000))
+        if item.etag:
+            self.etags += item.etag.encode('utf-8')
+        self.etag_ends.append(len(self.etags))
+        if item.last_modified:
+            self.modified += item.last_modified.encode('utf-8')
+        self.modified_ends.append(len(self.modified))
+        code = 0
+        if item.storage_class:
+            code = self.class_codes.get(item.storage_class)
+            if code is None:
+                code = self.class_codes[item.storage_class] = len(self.class_names)
+                self.class_names.append(item.storage_class)
+        self.classes.append(code)
+
+        self.count += 1
+
+        if self.memory_bytes >= self.memory_budget:
+            self._spill()
+
+    def extend(self, items: Iterable[ObjectInfo]) -> None:
+        for item in items:
+            self.append(item)
+
+    def ranking(self, name: str, descending: bool = False) -> Iterator[Tuple[int, int]]:
+        """
+        按 name 列（"sizes" 或 "mtimes"）排序后依次产出 (位置, 大小)，值相等时按追加顺序。
+        排序交给 spill_dir 中的临时 SQLite 库，由 SQLite 在磁盘上完成，内存占用不随对象数增长。
+        """
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="ranking-", suffix=".db", dir=self.spill_dir)
+        os.close(fd)
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE ranking (position INTEGER PRIMARY KEY, value INTEGER, size INTEGER)")
+            conn.executemany("INSERT INTO ranking VALUES (?, ?, ?)", self._ranking_rows(_COLUMNS.index(name)))
+            conn.commit()
+            order = "DESC" if descending else "ASC"
+            yield from conn.execute(f"SELECT position, size FROM ranking ORDER BY value {order}, position")
+        finally:
+            conn.close()
+            os.remove(path)
+
+    def _ranking_rows(self, column: int):
+        position = 0
+        sizes = _COLUMNS.index("sizes")
+        for segment in self._segments():
+            for value, size in zip(segment[column], segment[sizes]):
+                yield position, value, size
+                position += 1
+
+    def __iter__(self) -> Iterator[ObjectInfo]:
+        for segment in self._segments():
+            yield from _iter_columns(self.class_names, *segment)
+
+    def _segments(self):
+        if self.spill_file is not None:
+            self.spill_file.flush()
+            with open(self.spill_file.name, 'rb') as f:
+                for _ in range(self.spilled):
+                    yield _read_segment(f)
+        yield (self.keys, self.key_ends, self.sizes, self.mtimes, self.etags, self.etag_ends,
+               self.modified, self.modified_ends, self.classes)
+
+    def _spill(self) -> None:
+        """把内存中的列作为一个分段追加到临时文件，然后清空。"""
+        if self.spill_file is None:
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok=True)
+            self.spill_file = tempfile.NamedTemporaryFile(prefix="index-", suffix=".bin", dir=self.spill_dir)
+
+        f = self.spill_file
+        f.write(_SEGMENT_HEADER.pack(len(self.sizes), len(self.keys), len(self.etags), len(self.modified)))
+        for column in (self.key_ends, self.sizes, self.mtimes, self.etag_ends, self.modified_ends, self.classes):
+            column.tofile(f)
+        f.write(self.keys)
+        f.write(self.etags)
+        f.write(self.modified)
+        self.spilled += 1
+        self._reset()
+
+    def close(self) -> None:
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        self._reset()
+
+
+def _read_segment(f):
+    count, key_bytes, etag_bytes, modified_bytes = _SEGMENT_HEADER.unpack(f.read(_SEGMENT_HEADER.size))
+    columns = []
+    for _ in range(5):
+        column = array('q')
+        column.fromfile(f, count)
+        columns.append(column)
+    key_ends, sizes, mtimes, etag_ends, modified_ends = columns
+    classes = array('h')
+    classes.fromfile(f, count)
+    keys, etags, modified = f.read(key_bytes), f.read(etag_bytes), f.read(modified_bytes)
+    return keys, key_ends, sizes, mtimes, etags, etag_ends, modified, modified_ends, classes
+
+
+def _iter_columns(class_names, keys, key_ends, sizes, mtimes, etags, etag_ends, modified, modified_ends,
+                  classes) -> Iterator[ObjectInfo]:
+    key_start = etag_start = modified_start = 0
+    for i in range(len(sizes)):
+        key_end, etag_end, modified_end = key_ends[i], etag_ends[i], modified_ends[i]
+        yield ObjectInfo(keys[key_start:key_end].decode('utf-8'), sizes[i],
+                         etags[etag_start:etag_end].decode('utf-8') or None,
+                         modified[modified_start:modified_end].decode('utf-8') or None,
+                         class_names[classes[i]])
+        key_start, etag_start, modified_start = key_end, etag_end, modified_end
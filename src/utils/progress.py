@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+
+from tqdm import tqdm
+
+# 刷新间隔（秒）：下载路径只累加计数器，由刷新线程按固定频率汇总到进度条
+REFRESH_INTERVAL = 0.5
+
+# 速率的指数平滑系数，越大越跟随最近一次刷新的变化
+SMOOTHING = 0.3
+
+# 进度条后缀中最多逐个列出的存储桶数
+SHOWN_BUCKETS = 3
+
+BAR_FORMAT = "{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}{postfix}]"
+
+
+class Transfer:
+    """
+    一个对象的下载计数器：由下载它的线程（或协程）直接累加 bytes，刷新线程只读取，热路径上没有锁和进度条调用。
+    分段下载时多个线程写同一个对象，改用 add 加锁累加。
+    调度器把拖尾的单流下载的 split 置为 True，下载线程读到后在当前位置停下，剩余部分改为分段下载。
+    """
+    __slots__ = ("bucket", "size", "bytes", "lock", "started", "split")
+
+    def __init__(self, bucket: str, size: int) -> None:
+        self.bucket = bucket
+        self.size = size or 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.split = False
+
+    def add(self, count: int) -> None:
+        with self.lock:
+            self.bytes += count
+
+
+class _Rate:
+    """一组累计量（字节、对象数）和它们的平滑速率。"""
+    __slots__ = ("total_bytes", "total_objects", "done_bytes", "done_objects", "received",
+                 "started", "last_time", "last_received", "last_objects", "byte_rate", "object_rate")
+
+    def __init__(self) -> None:
+        self.total_bytes = self.total_objects = 0
+        # 已结束对象按列举大小计入 done_bytes；received 是实际收到的字节（含重试）
+        self.done_bytes = self.done_objects = self.received = 0
+        self.started = None
+        self.last_time = None
+        self.last_received = self.last_objects = 0
+        self.byte_rate = self.object_rate = None
+
+    def begin(self, now: float) -> None:
+        if self.started is None:
+            self.started = self.last_time = now
+
+    def sample(self, now: float, received: int) -> None:
+        if self.last_time is None or now <= self.last_time:
+            return
+        elapsed = now - self.last_time
+        byte_rate = (received - self.last_received) / elapsed
+        object_rate = (self.done_objects - self.last_objects) / elapsed
+        if self.byte_rate is None:
+            self.byte_rate, self.object_rate = byte_rate, object_rate
+        else:
+            self.byte_rate += SMOOTHING * (byte_rate - self.byte_rate)
+            self.object_rate += SMOOTHING * (object_rate - self.object_rate)
+        self.last_time, self.last_received, self.last_objects = now, received, self.done_objects
+
+    def eta(self, position: int):
+        remaining = self.total_bytes - position
+        if remaining <= 0 or not self.byte_rate:
+            return None
+        return remaining / self.byte_rate
+
+
+class Progress:
+    """
+    按字节计的下载进度：列举时累加各存储桶的总量，下载时按响应体实际流过的字节计数。
+    下载路径只累加各自的 Transfer，刷新线程每 REFRESH_INTERVAL 秒汇总一次，更新进度条，
+    并给出总体和各存储桶的 MB/s、对象/s 和剩余时间。对象结束时（成功、失败或去重链接）按列举大小计入完成量，
+    正在下载的对象按已收到的字节计入，大对象下载期间进度也会前进。
+    """
+
+    def __init__(self, desc: str, interval: float = REFRESH_INTERVAL) -> None:
+        self.bar = tqdm(total=0, unit='B', unit_scale=True, desc=desc, bar_format=BAR_FORMAT)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.overall = _Rate()
+        self.buckets = {}
+        self.transfers = set()
+        self.status = ""
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="progress", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+        self._refresh()
+        self.bar.close()
+
+    def _bucket(self, bucket: str) -> _Rate:
+        stats = self.buckets.get(bucket)
+        if stats is None:
+            stats = self.buckets[bucket] = _Rate()
+        return stats
+
+    def grow(self, bucket: str, total_bytes: int, objects: int) -> None:
+        """列举到新的待下载对象，扩大总量。"""
+        with self.lock:
+            for stats in (self._bucket(bucket), self.overall):
+                stats.total_bytes += total_bytes
+                stats.total_objects += objects
+
+    def start(self, bucket: str, size: int) -> Transfer:
+        transfer = Transfer(bucket, size)
+        now = time.monotonic()
+        with self.lock:
+            for stats in (self._bucket(bucket), self.overall):
+                stats.begin(now)
+            self.transfers.add(transfer)
+        return transfer
+
+    def finish(self, transfer: Transfer) -> None:
+        with self.lock:
+            self.transfers.discard(transfer)
+            for stats in (self._bucket(transfer.bucket), self.overall):
+                stats.received += transfer.bytes
+                stats.done_bytes += transfer.size
+                stats.done_objects += 1
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+
+    def finish_bucket(self, bucket: str) -> None:
+        """存储桶处理完毕：输出它的平均吞吐，并从进度条后缀中移除。"""
+        with self.lock:
+            stats = self.buckets.pop(bucket, None)
+        if stats is None or stats.started is None:
+            return
+        elapsed = max(time.monotonic() - stats.started, 1e-6)
+        logging.info(f"Throughput: {tqdm.format_sizeof(stats.received / elapsed, 'B/s')}, "
+                     f"{stats.done_objects / elapsed:.1f} objects/s "
+                     f"({stats.done_objects} objects in {tqdm.format_interval(elapsed)})")
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self._refresh()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        with self.lock:
+            # 正在下载的对象：收到的字节计入速率，不超过对象大小的部分计入进度
+            live = {}
+            for transfer in self.transfers:
+                received, position = live.get(transfer.bucket, (0, 0))
+                count = transfer.bytes
+                live[transfer.bucket] = (received + count,
+                                         position + (min(count, transfer.size) if transfer.size else count))
+
+            parts = []
+            for bucket, stats in self.buckets.items():
+                received, position = live.get(bucket, (0, 0))
+                stats.sample(now, stats.received + received)
+                if stats.started is not None and len(parts) < SHOWN_BUCKETS:
+                    position += stats.done_bytes
+                    percent = 100 * position / stats.total_bytes if stats.total_bytes else 100
+                    parts.append(f"{bucket} {percent:.0f}% {_format(stats, position)}")
+            if len(self.buckets) > SHOWN_BUCKETS:
+                parts.append(f"+{len(self.buckets) - SHOWN_BUCKETS} more")
+
+            overall = self.overall
+            received = sum(value[0] for value in live.values())
+            position = overall.done_bytes + sum(value[1] for value in live.values())
+            overall.sample(now, overall.received + received)
+            summary = [_format(overall, position), self.status]
+            if len(self.buckets) > 1:
+                summary += parts
+            total = overall.total_bytes
+
+        self.bar.total = total
+        self.bar.n = min(position, total)
+        self.bar.set_postfix_str(" | ".join(part for part in summary if part), refresh=False)
+        self.bar.refresh()
+
+
+def _format(stats: _Rate, position: int) -> str:
+    eta = stats.eta(position)
+    return (f"{tqdm.format_sizeof(stats.byte_rate or 0, 'B/s')}, {stats.object_rate or 0:.1f} obj/s, "
+            f"ETA {tqdm.format_interval(eta) if eta is not None else '--:--'}")
@@ -0,0 +1,141 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# 限流（429/503 SlowDown）与服务端临时错误，可以稍后重试
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+# 网络层的临时错误（包括 ReadTimeout、连接被重置）
+RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+
+def retry_after_seconds(headers):
+    """解析 Retry-After（秒数或 HTTP 日期），没有或无法解析时返回 None。"""
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    带抖动的指数退避：第 n 次重试前等待 [0, min(max_backoff, backoff * 2^n)] 内的随机时长，
+    服务端给出 Retry-After 时至少等待该时长。
+    """
+
+    def __init__(self, retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0) -> None:
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+
+class AdaptiveLimit:
+    """
+    单个端点的 AIMD 并发上限：每个正常响应把上限加 1/limit（约每轮并发加 1），
+    遇到限流或超时时减半，cooldown 秒内的连续限流只减一次，上限保持在 [minimum, maximum]。
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, decrease: float = 0.5, cooldown: float = 1.0) -> None:
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.value = float(maximum)
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self.value)
+
+    def on_success(self) -> None:
+        with self.lock:
+            if self.value < self.maximum:
+                self.value = min(self.maximum, self.value + 1 / self.value)
+
+    def on_throttle(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.value = max(self.minimum, self.value * self.decrease)
+        logging.debug(f"Endpoint throttled, concurrency limit lowered to {self.limit}")
+
+
+class ConcurrencyController:
+    """按端点维护 AdaptiveLimit，调度器据此决定每个端点同时进行的下载数。"""
+
+    def __init__(self, maximum: int) -> None:
+        self.maximum = maximum
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def for_endpoint(self, endpoint: str) -> AdaptiveLimit:
+        with self.lock:
+            limit = self.limits.get(endpoint)
+            if limit is None:
+                limit = self.limits[endpoint] = AdaptiveLimit(self.maximum)
+            return limit
+
+
+def request_with_retry(send, url, policy: RetryPolicy, throttle: AdaptiveLimit = None, trace=None, **kwargs):
+    """
+    发送请求，遇到可重试的状态码或网络错误时按 policy 退避后重试。
+    返回最后一次的响应（可能仍是错误状态码），重试用尽后网络错误照常抛出。
+    传入 trace（metrics.RequestTrace）时记录重试次数和最后一次尝试的连接、首字节耗时。
+    """
+    attempt = 0
+    while True:
+        if trace is not None:
+            trace.sent()
+        try:
+            response = send(url, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if trace is not None:
+                trace.error = repr(e)
+            if throttle is not None and isinstance(e, requests.exceptions.Timeout):
+                throttle.on_throttle()
+            if attempt >= policy.retries:
+                raise
+            error, wait = e, policy.delay(attempt)
+        else:
+            if trace is not None:
+                trace.received(response)
+            if response.status_code not in RETRYABLE_STATUS:
+                if throttle is not None:
+                    throttle.on_success()
+                return response
+            if throttle is not None and response.status_code in THROTTLE_STATUS:
+                throttle.on_throttle()
+            if attempt >= policy.retries:
+                return response
+            error, wait = response.status_code, policy.delay(attempt, retry_after_seconds(response.headers))
+            # 读完（很短的）错误响应体再关闭，连接可以放回连接池
+            response.content
+            response.close()
+
+        attempt += 1
+        if trace is not None:
+            trace.retries += 1
+        logging.debug(f"Retrying {url} in {wait:.2f}s after {error} (attempt {attempt}/{policy.retries})")
+        time.sleep(wait)
@@ -0,0 +1,464 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.handlers import BucketFactory
+from src.handlers.listing import ListingError
+from src.utils.bucket_handler import MB, finish_bucket, prepare_bucket, progress_desc, sync_filter, track_pages
+from src.utils.checksum import ChecksumMismatch
+from src.utils.dedup import WAITING, DedupIndex
+from src.utils.manifest import Manifest
+from src.utils.progress import Progress
+from src.utils.retry import ConcurrencyController, RetryPolicy
+from src.utils.selection import Selection
+from src.utils.sinks import FileSink
+from src.utils.transfer import RangedDownloader
+
+# 不超过这个大小的对象按批提交：一个下载线程依次下载一批，每批最多 BATCH_OBJECTS 个、BATCH_BYTES 字节
+TINY_OBJECT = 64 * 1024
+BATCH_OBJECTS = 16
+BATCH_BYTES = MB
+
+# 拖尾检测：每隔 STRAGGLER_CHECK 秒检查一次，单流下载至少进行了 STRAGGLER_GRACE 秒才估算速率，
+# 剩余不足 STRAGGLER_MIN_BYTES 的对象不拆分
+STRAGGLER_CHECK = 1.0
+STRAGGLER_GRACE = 2.0
+STRAGGLER_MIN_BYTES = 4 * MB
+
+
+def endpoint_of(bucket_url: str, bucket_name: str) -> str:
+    """存储桶所在的服务端点：虚拟主机风格的 URL 去掉开头的存储桶名，同一地域的存储桶共用一个端点。"""
+    host = urllib.parse.urlsplit(bucket_url).netloc
+    label, _, rest = host.partition(".")
+    return rest if label == bucket_name and rest else host
+
+
+class _BucketJob:
+    """
+    调度器中一个存储桶的状态：列举线程产出的待下载对象，以及在途下载数。
+    待下载对象按大小分为两个通道：small 按列举顺序排队，large 是按大小从大到小出队的堆。
+    """
+
+    def __init__(self, bucket_url: str, bucket_name: str, log_dir: str) -> None:
+        self.bucket_url = bucket_url
+        self.bucket_name = bucket_name
+        self.log_dir = log_dir
+        self.endpoint = endpoint_of(bucket_url, bucket_name)
+        self.throttle = None
+        self.handler = None
+        self.manifest = None
+        self.small = deque()
+        self.large = []
+        self.listing = True
+        self.listed = False
+        self.inflight = 0
+        # 等待相同内容下载完成的重复对象数（--dedup）
+        self.waiting = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self.small) + len(self.large)
+
+    @property
+    def drained(self) -> bool:
+        return not self.listing and not self.queued and not self.inflight and not self.waiting
+
+
+class BucketScheduler:
+    """
+    全局调度器：同时列举并下载多个存储桶，所有存储桶共用一个下载线程池和一个按字节计的进度（见 Progress）。
+    每个存储桶由自己的列举线程把对象放入待下载队列，调度线程按轮转从各队列取任务提交，
+    单个存储桶、单个端点的在途下载数分别受 --per-bucket / --per-endpoint 限制，大存储桶不会饿死其他存储桶。
+    端点的上限由 AIMD 控制器动态调整：遇到限流时减半，响应正常时逐步恢复到 --per-endpoint。
+    --dedup 时所有存储桶共用一个 DedupIndex，内容相同的对象只下载一次，其余建立硬链接。
+    下载内容写入 sink（默认每个对象一个本地文件，见 --sink）。
+
+    按列举得到的大小调度：不小于 --large-object 的对象进入大对象通道，从大到小提交，同时最多占用 --large-lane 个线程，
+    其余线程留给小对象，几个大对象不会挡住成千上万个小文件；只剩大对象时不再限制。
+    不超过 TINY_OBJECT 的对象按批交给一个下载线程依次下载，减少调度和线程池的开销。
+    拖尾的单流下载（预计剩余时间超过 --straggler-after，且明显慢于其他下载或已经没有排队的对象）
+    在当前位置停下，剩余字节交给分段线程池按 Range 并行下载。
+    """
+
+    def __init__(self, session, args, metrics=None, sink=None) -> None:
+        self.session = session
+        self.args = args
+        self.metrics = metrics
+        self.sink = sink or FileSink()
+        self.threads = args.threads
+        self.per_bucket = args.per_bucket or args.threads
+        self.per_endpoint = args.per_endpoint or args.threads
+        self.controller = ConcurrencyController(self.per_endpoint)
+        self.large_size = args.large_object * MB
+        self.large_lane = args.large_lane or max(1, args.threads // 2)
+        self.large_inflight = 0
+        self.sequence = itertools.count()
+        # 可以拆分的在途单流下载（Transfer），由拖尾检测线程检查
+        self.streams = set()
+        self.watching = threading.Event()
+        self.retry_policy = RetryPolicy(args.retries, args.backoff)
+        self.dedup = DedupIndex() if args.dedup else None
+        # 每个存储桶最多预先排队的对象数，列举超前时阻塞列举线程
+        self.backlog = args.threads * 4
+
+        self.cond = threading.Condition()
+        self.active = []
+        self.turn = 0
+        self.inflight = 0
+        self.endpoints = Counter()
+        self.stopped = False
+        self.finished = 0
+        self.progress = None
+
+    def run(self, bucket_urls) -> None:
+        pending = deque(bucket_urls)
+        self.total = len(pending)
+        with Progress(progress_desc(bucket_urls)) as self.progress, \
+                ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="download") as executor, \
+                RangedDownloader(self.args.multipart_threshold * MB, self.args.part_size * MB,
+                                 self.args.part_workers) as ranged:
+            splitting = self.sink.local and self.args.straggler_after > 0
+            if splitting:
+                threading.Thread(target=self._watch_stragglers, name="stragglers", daemon=True).start()
+            try:
+                while True:
+                    with self.cond:
+                        task = self._next_task(pending)
+                    if task is None:
+                        break
+
+                    job, items = task
+                    if items is None:
+                        self._finish(job)
+                        continue
+                    if len(items) > 1:
+                        future = self._submit(executor, job, self._download_batch, job, items)
+                        future.add_done_callback(lambda f, job=job: self._batch_done(job, f))
+                        continue
+
+                    item = items[0]
+                    large = self._is_large(item)
+                    local_path = self.sink.path(job.bucket_name, item.key)
+                    claimed = False
+                    if self.dedup is not None:
+                        source = self._claim(job, item, local_path)
+                        if source is WAITING:
+                            continue
+                        if source is not None:
+                            # 相同内容已下载完成，直接链接，不发出 GET
+                            transfer = self.progress.start(job.bucket_name, item.size)
+                            future = self._submit(executor, job, self.dedup.link, source, local_path, item.size)
+                            future.add_done_callback(
+                                lambda f, job=job, item=item, path=local_path, transfer=transfer, large=large:
+                                self._done(job, item, path, f, transfer, large=large))
+                            continue
+                        claimed = True
+
+                    transfer = self.progress.start(job.bucket_name, item.size)
+                    if self.sink.local and ranged.accepts(item.size):
+                        # 大对象拆分为多个 Range 请求并行下载，按偏移量写入本地文件
+                        future = self._submit(executor, job, ranged.download_object, job.handler, item.key,
+                                              local_path, item.size, transfer)
+                    else:
+                        if splitting and item.size >= STRAGGLER_MIN_BYTES:
+                            with self.cond:
+                                self.streams.add(transfer)
+                        future = self._submit(executor, job, self._download, ranged, job, item, local_path,
+                                              transfer)
+                    future.add_done_callback(
+                        lambda f, job=job, item=item, path=local_path, transfer=transfer, claimed=claimed,
+                        large=large: self._done(job, item, path, f, transfer, claimed, large))
+            finally:
+                self.watching.set()
+                with self.cond:
+                    self.stopped = True
+                    self.cond.notify_all()
+
+        if self.dedup is not None:
+            self.dedup.log_summary()
+
+    def _submit(self, executor, job: _BucketJob, fn, *args):
+        """提交下载任务，开始执行时记录它在线程池中的排队时间。"""
+        submitted = time.perf_counter()
+
+        def run():
+            if self.metrics is not None:
+                self.metrics.observe_queue(job.handler.metric_labels, time.perf_counter() - submitted)
+            return fn(*args)
+
+        return executor.submit(run)
+
+    def _next_task(self, pending):
+        """
+        在锁内等待下一项工作：返回 (job, [item, ...]) 表示提交一个下载（或一批小对象），(job, None) 表示该存储桶已处理完，
+        None 表示全部完成。活跃存储桶不足 --bucket-workers 个时从 pending 中补充。
+        """
+        while True:
+            while pending and len(self.active) < self.args.bucket_workers:
+                self._start(pending.popleft())
+            if not self.active:
+                return None
+
+            for job in self.active:
+                if job.drained:
+                    self.active.remove(job)
+                    return job, None
+
+            if self.inflight < self.threads:
+                picked = self._pick()
+                if picked is not None:
+                    job, large = picked
+                    items = [heapq.heappop(job.large)[2]] if large else self._take_small(job)
+                    job.inflight += 1
+                    self.inflight += 1
+                    self.large_inflight += large
+                    self.endpoints[job.endpoint] += 1
+                    # 队列腾出位置，唤醒可能因积压而等待的列举线程
+                    self.cond.notify_all()
+                    return job, items
+
+            self.cond.wait()
+
+    def _pick(self):
+        """
+        从上次的位置开始轮转，找到第一个有待下载对象且未超过存储桶、端点上限的存储桶，返回 (job, 是否取大对象)。
+        大对象通道有空位时先取大对象，最大的对象最先开始，缩短最后的拖尾。
+        """
+        large_open = self.large_inflight < self.large_lane or self._tail()
+        count = len(self.active)
+        for offset in range(count):
+            job = self.active[(self.turn + offset) % count]
+            if job.inflight >= self.per_bucket or self.endpoints[job.endpoint] >= job.throttle.limit:
+                continue
+            if job.large and large_open:
+                large = True
+            elif job.small:
+                large = False
+            else:
+                continue
+            self.turn = (self.turn + offset + 1) % count
+            return job, large
+        return None
+
+    def _tail(self) -> bool:
+        """列举都已结束且没有排队的小对象：大对象可以占满所有线程，拖尾的下载也可以拆分。"""
+        return not any(job.listing or job.small for job in self.active)
+
+    def _take_small(self, job: _BucketJob):
+        """
+        取一个小对象；队首是极小的对象时连同后面的极小对象一起取出，交给同一个下载线程。
+        每批不超过排队数的 1/threads，队列快空时不会把剩下的对象都压在一个线程上。--dedup 时逐个认领，不成批。
+        """
+        item = job.small.popleft()
+        items = [item]
+        if self.dedup is not None or item.size > TINY_OBJECT:
+            return items
+
+        limit = min(BATCH_OBJECTS, len(job.small) // self.threads + 1)
+        total = item.size
+        while len(items) < limit and job.small and job.small[0].size <= TINY_OBJECT \
+                and total + job.small[0].size <= BATCH_BYTES:
+            item = job.small.popleft()
+            items.append(item)
+            total += item.size
+        return items
+
+    def _is_large(self, item) -> bool:
+        return item.size >= self.large_size
+
+    def _enqueue(self, job: _BucketJob, item, first: bool = False) -> None:
+        if self._is_large(item):
+            heapq.heappush(job.large, (-item.size, next(self.sequence), item))
+        elif first:
+            job.small.appendleft(item)
+        else:
+            job.small.append(item)
+
+    def _start(self, bucket_url: str) -> None:
+        bucket_name, log_dir = prepare_bucket(bucket_url, self.args.module, self.args.shard)
+        if log_dir is None:
+            self.total -= 1
+            return
+
+        job = _BucketJob(bucket_url, bucket_name, log_dir)
+        job.throttle = self.controller.for_endpoint(job.endpoint)
+        self.active.append(job)
+        threading.Thread(target=self._list, args=(job,), name=f"list-{bucket_name}", daemon=True).start()
+
+    def _list(self, job: _BucketJob) -> None:
+        """列举线程：创建处理器和清单，把需要下载的对象放入该存储桶的队列。"""
+        args = self.args
+        try:
+            job.handler = BucketFactory.get_handler(job.bucket_url, self.session, args.module)
+            job.handler.set_download_options(args.buffer_size * 1024, args.preallocate, self.sink)
+            job.handler.set_retry_options(self.retry_policy, job.throttle)
+            job.handler.set_metrics(self.metrics, job.bucket_name, job.endpoint)
+            job.manifest = Manifest(os.path.join(job.log_dir, "manifest.db"), resume=args.resume, sync=args.sync)
+
+            selection = Selection.from_args(args, spill_dir=job.log_dir)
+            # 排序选择要等整个存储桶列举完才产出对象，此时不保存分区游标，续传时重新列举
+            cursors = None if selection.ordered else job.manifest
+            pages = job.handler.list_objects_parallel(args.list_workers, args.prefix, cursors=cursors,
+                                                       shard=args.shard)
+            for keys in track_pages(pages, job.manifest, self.progress, job.bucket_name,
+                                    sync_filter(args, job.bucket_name), selection):
+                self.sink.prepare(job.bucket_name, keys)
+                with self.cond:
+                    for item in keys:
+                        self._enqueue(job, item)
+                    self.cond.notify_all()
+                    while job.queued >= self.backlog and not self.stopped:
+                        self.cond.wait()
+                    if self.stopped:
+                        return
+            job.listed = not job.handler.list_errors
+            if job.handler.list_errors:
+                logging.warning(f"Listing of {job.bucket_url} is incomplete ({job.handler.list_errors} pages failed "
+                                f"after retries). Run again with --resume to continue from the last good page.")
+        except ListingError:
+            logging.warning(f"Listing of {job.bucket_url} stopped after retries. "
+                            f"Run again with --resume to continue from the last good page.")
+        except requests.exceptions.ReadTimeout:
+            logging.error(f"Timeout while trying to access {job.bucket_url}. Please check your connection and try again.")
+        except Exception as e:
+            logging.error(f"An error occurred while accessing {job.bucket_url}: {str(e)}")
+        finally:
+            with self.cond:
+                job.listing = False
+                self.cond.notify_all()
+
+    def _claim(self, job: _BucketJob, item, local_path: str):
+        """向 DedupIndex 认领对象内容；需要等待时让出下载槽位，内容下载结束后对象重新排到队首。"""
+        with self.cond:
+            source = self.dedup.claim(item, local_path, lambda: self._requeue(job, item))
+            if source is WAITING:
+                self._release(job, self._is_large(item))
+                job.waiting += 1
+        return source
+
+    def _requeue(self, job: _BucketJob, item) -> None:
+        with self.cond:
+            job.waiting -= 1
+            self._enqueue(job, item, first=True)
+            self.cond.notify_all()
+
+    def _release(self, job: _BucketJob, large: bool = False) -> None:
+        job.inflight -= 1
+        self.inflight -= 1
+        self.large_inflight -= large
+        self.endpoints[job.endpoint] -= 1
+        self.cond.notify_all()
+
+    def _release_locked(self, job: _BucketJob, large: bool = False) -> None:
+        with self.cond:
+            self._release(job, large)
+
+    def _download(self, ranged, job: _BucketJob, item, local_path: str, transfer) -> None:
+        """单流下载一个对象；被判定为拖尾而中途停下时，剩余部分改为分段下载。"""
+        offset = job.handler.download_object(item.key, local_path, item.size, transfer)
+        if offset is not None:
+            logging.debug(f"Splitting the remaining {item.size - offset} bytes of {job.bucket_url}/{item.key} "
+                          f"into byte ranges")
+            transfer.split = False
+            ranged.download_remainder(job.handler, item.key, local_path, item.size, offset, transfer)
+
+    def _download_batch(self, job: _BucketJob, items) -> None:
+        """
+        在一个下载线程里依次下载一批极小的对象，每个对象单独记录结果和进度。
+        某个对象下载或提交出错只影响它自己：记为失败后继续下载批中其余的对象。
+        """
+        for item in items:
+            local_path = self.sink.path(job.bucket_name, item.key)
+            transfer = self.progress.start(job.bucket_name, item.size)
+            succeeded = False
+            try:
+                job.handler.download_object(item.key, local_path, item.size, transfer)
+                succeeded = True
+            except ChecksumMismatch:
+                # 处理器已经记录过
+                pass
+            except Exception as e:
+                logging.error(f"Failed to download {job.bucket_url}/{item.key}: {e}")
+            finally:
+                try:
+                    self._commit(job, item, local_path, succeeded, transfer)
+                except Exception as e:
+                    logging.error(f"Failed to record {job.bucket_url}/{item.key}: {e}")
+
+    def _batch_done(self, job: _BucketJob, future) -> None:
+        try:
+            if future.exception() is not None:
+                logging.error(f"A batch of small objects from {job.bucket_url} failed: {future.exception()}")
+        finally:
+            self._release_locked(job)
+
+    def _commit(self, job: _BucketJob, item, local_path: str, succeeded: bool, transfer, claimed: bool = False):
+        try:
+            completed = self.sink.commit(item, local_path, job.manifest, succeeded)
+            if claimed:
+                self.dedup.resolve(item, completed)
+        finally:
+            self.progress.finish(transfer)
+
+    def _done(self, job: _BucketJob, item, local_path: str, future, transfer, claimed: bool = False,
+              large: bool = False) -> None:
+        try:
+            self._commit(job, item, local_path, future.exception() is None, transfer, claimed)
+        finally:
+            with self.cond:
+                self.streams.discard(transfer)
+                self._release(job, large)
+
+    def _watch_stragglers(self) -> None:
+        """拖尾检测线程：定期检查可以拆分的在途单流下载，给拖尾的对象置位 split。"""
+        while not self.watching.wait(STRAGGLER_CHECK):
+            with self.cond:
+                streams = list(self.streams)
+                tail = self._tail()
+            for transfer in self._stragglers(streams, tail, time.monotonic()):
+                transfer.split = True
+                with self.cond:
+                    self.streams.discard(transfer)
+
+    def _stragglers(self, streams, tail: bool, now: float):
+        """
+        预计剩余时间超过 --straggler-after 的下载，在速率不到在途下载中位数一半时、
+        或者已经没有排队的对象（拆分不会挤占其他对象的线程）时判为拖尾。
+        """
+        rates = []
+        for transfer in streams:
+            elapsed = now - transfer.started
+            if elapsed >= STRAGGLER_GRACE:
+                rates.append((transfer.bytes / elapsed, transfer))
+        if not rates:
+            return []
+
+        median = sorted(rate for rate, _ in rates)[len(rates) // 2]
+        stragglers = []
+        for rate, transfer in rates:
+            remaining = transfer.size - transfer.bytes
+            if remaining >= STRAGGLER_MIN_BYTES and rate * self.args.straggler_after < remaining \
+                    and (tail or rate * 2 < median):
+                stragglers.append(transfer)
+        return stragglers
+
+    def _finish(self, job: _BucketJob) -> None:
+        if job.manifest is not None:
+            # 归档或 MinIO 输出在对象写出后才更新清单，先等这个存储桶的对象全部写出
+            self.sink.flush(job.manifest)
+            with job.manifest:
+                finish_bucket(job.manifest, job.bucket_url, job.bucket_name, job.log_dir, self.args, job.listed)
+        self.progress.finish_bucket(job.bucket_name)
+
+        self.finished += 1
+        if self.total > 1:
+            with self.cond:
+                self.progress.set_status(f"{self.finished}/{self.total} buckets, {len(self.active)} active")
@@ -0,0 +1,163 @@
+import fnmatch
+import logging
+import re
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+from src.handlers.base import ObjectInfo
+from src.utils.object_index import ObjectIndex
+from src.utils.sync import parse_last_modified
+
+# 预算选择的顺序：列举顺序、从小到大、从新到旧
+ORDERS = ("listing", "smallest", "newest")
+
+_PAGE_SIZE = 1000
+
+
+def parse_size(value: str) -> int:
+    """解析 1024、64K、1.5M、2G 这样的大小（按 1024 进制）。"""
+    units = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*", value.upper())
+    if match is None:
+        raise ValueError(f"invalid size: {value}")
+    return int(float(match.group(1)) * units[match.group(2)])
+
+
+def parse_since(value: str) -> float:
+    """解析 2024-01-31 或 2024-01-31T12:00:00 这样的时间，不带时区时按本地时间。"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class Selection:
+    """
+    列举时就地筛选对象，被跳过的对象不会产生任何 GET 请求，也不会计入进度条总量。
+    条件包括 include/exclude 通配符（匹配完整键名）、正则、大小区间和修改时间；
+    max_bytes 为本次运行的字节预算，按 order 依次取对象，放不下的跳过。
+    按列举顺序时边列举边选择；按大小或时间排序时需要先列举完（筛选后的对象暂存在 ObjectIndex 中）再选择。
+    """
+
+    def __init__(self, include=None, exclude=None, regex=None, min_size=None, max_size=None, modified_since=None,
+                 max_bytes=None, order="listing", spill_dir=None) -> None:
+        self.include = include or []
+        self.exclude = exclude or []
+        self.regex = re.compile(regex) if regex else None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_since = modified_since
+        self.max_bytes = max_bytes
+        self.order = order
+        self.spill_dir = spill_dir
+        self.used = 0
+        self.index = None
+
+    @classmethod
+    def from_args(cls, args, spill_dir=None):
+        return cls(args.include, args.exclude, args.regex, args.min_size, args.max_size, args.modified_since,
+                   args.max_bytes, args.order, spill_dir)
+
+    @property
+    def filtering(self) -> bool:
+        """是否只选择了部分对象（此时没有被列举到的对象不能当作远端已删除）。"""
+        return bool(self.include or self.exclude or self.regex or self.min_size is not None
+                    or self.max_size is not None or self.modified_since is not None or self.max_bytes is not None)
+
+    @property
+    def ordered(self) -> bool:
+        """是否需要先列举完整个存储桶再按顺序选择。"""
+        return self.max_bytes is not None and self.order != "listing"
+
+    def matches(self, item: ObjectInfo) -> bool:
+        key = item.key
+        if self.include and not any(fnmatch.fnmatchcase(key, pattern) for pattern in self.include):
+            return False
+        if any(fnmatch.fnmatchcase(key, pattern) for pattern in self.exclude):
+            return False
+        if self.regex is not None and not self.regex.search(key):
+            return False
+        if self.min_size is not None and item.size < self.min_size:
+            return False
+        if self.max_size is not None and item.size > self.max_size:
+            return False
+        if self.modified_since is not None:
+            # 无法得知修改时间的对象保留，避免漏下
+            mtime = parse_last_modified(item.last_modified)
+            if mtime is not None and mtime < self.modified_since:
+                return False
+        return True
+
+    def resume(self, manifest) -> None:
+        """续传时清单中已记录的对象（已完成的和将被补下载的）已经占用了预算，从已用字节中扣除。"""
+        if manifest.resumed and self.max_bytes is not None:
+            self.used += manifest.summary()[1]
+
+    def record(self, pages: Iterable[List[ObjectInfo]], manifest, is_current=None) -> Iterator[List[ObjectInfo]]:
+        """逐页筛选列举结果并记入清单，产出选中、需要下载的对象；清单中未变而被跳过的对象不占用预算。"""
+        self.resume(manifest)
+        for keys in pages:
+            if self.ordered:
+                manifest.record_page(keys, is_current, select=self.collect)
+            else:
+                yield manifest.record_page(keys, is_current, select=self.select_page)
+        for keys in self.ordered_pages():
+            yield manifest.record_page(keys, is_current)
+
+    def select_page(self, keys: List[ObjectInfo]) -> List[ObjectInfo]:
+        """按列举顺序筛选一页；有预算时依次扣减，放不下的对象跳过。"""
+        selected = [item for item in keys if self.matches(item)]
+        if self.max_bytes is None:
+            return selected
+
+        remaining = self.max_bytes - self.used
+        within = []
+        for item in selected:
+            if item.size <= remaining:
+                within.append(item)
+                remaining -= item.size
+        self.used = self.max_bytes - remaining
+        return within
+
+    def collect(self, keys: List[ObjectInfo]) -> List[ObjectInfo]:
+        """排序选择时先把符合条件的对象暂存到列式索引中；列举完成前不选出任何对象，返回空列表。"""
+        if self.index is None:
+            self.index = ObjectIndex(spill_dir=self.spill_dir)
+        self.index.extend(item for item in keys if self.matches(item))
+        return []
+
+    def ordered_pages(self) -> Iterator[List[ObjectInfo]]:
+        """列举完成后按顺序在预算内选择，再按列举顺序分页产出被选中的对象。"""
+        if self.index is None:
+            return
+
+        with self.index as index:
+            # 排序在磁盘上完成，内存中只有每个对象一个字节的选中标记
+            if self.order == "smallest":
+                ranking = index.ranking("sizes")
+            else:
+                ranking = index.ranking("mtimes", descending=True)
+
+            chosen = bytearray(len(index))
+            remaining = self.max_bytes - self.used
+            for position, size in ranking:
+                if size <= remaining:
+                    chosen[position] = 1
+                    remaining -= size
+                elif self.order == "smallest":
+                    # 从小到大时之后的对象也都放不下
+                    break
+            ranking.close()
+            selected = self.max_bytes - remaining - self.used
+            self.used = self.max_bytes - remaining
+
+            logging.info(f"Byte budget selected {chosen.count(1)} of {len(index)} matching files "
+                         f"({selected / (1024 * 1024):.2f} MB, {self.order} first)")
+
+            page = []
+            for position, item in enumerate(index):
+                if chosen[position]:
+                    page.append(item)
+                    if len(page) >= _PAGE_SIZE:
+                        yield page
+                        page = []
+            if page:
+                yield page
+        self.index = None
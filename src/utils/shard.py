@@ -0,0 +1,114 @@
+import glob
+import logging
+import os
+import re
+import zlib
+from typing import List, NamedTuple
+
+from src.handlers.base import ObjectInfo
+
+_SHARD_DIR = re.compile(r"shard-(\d+)-of-(\d+)$")
+
+# 分片完整列举结束后在自己的清单中记下的游标分区名，--merge-shards 据此找出没有列举完的分片
+LISTED_PARTITION = "shard:listed"
+
+
+class Shard(NamedTuple):
+    """
+    --shard i/N：同一个存储桶由 N 个进程（或 N 台机器）分担，本进程是第 i 个（从 1 开始）。
+    叶子列举分区按分区名的 CRC32 分给各分片，只有拥有该分区的分片去列举它；
+    其余列举结果（公共前缀之上的对象、不能分区列举的存储桶）按键名的 CRC32 分配。
+    分区的划分只取决于存储桶的内容，与 --list-workers、--engine 无关（见 PartitionedLister），
+    各分片互不重叠，合起来正好覆盖整个存储桶，任何分片都不需要与其他分片通信。
+    """
+    index: int
+    count: int
+
+    def owns(self, name: str) -> bool:
+        return zlib.crc32(name.encode('utf-8')) % self.count == self.index - 1
+
+    def select(self, keys: List[ObjectInfo]) -> List[ObjectInfo]:
+        return [item for item in keys if self.owns(item.key)]
+
+    @property
+    def dir_name(self) -> str:
+        return f"shard-{self.index}-of-{self.count}"
+
+
+def parse_shard(value: str) -> Shard:
+    """解析 --shard 的 i/N，例如 1/4。"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if match is None:
+        raise ValueError(f"invalid shard: {value}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"invalid shard: {value}")
+    return Shard(index, count)
+
+
+def merge_shards(bucket_urls, args) -> None:
+    """
+    --merge-shards：把各分片的 log/<module>/<bucket>/shard-i-of-N/ 合并到 log/<module>/<bucket>/：
+    清单合并为一份 manifest.db（之后可以不分片地 --resume、--verify 或 --sync），
+    据此重新生成 downloads.log 和统计信息，deleted.log 依次拼接。
+    合并时报告被多个分片记录的对象（重复下载），以及缺失或没有列举完的分片（它们的对象可能被漏下）。
+    分区游标不合并：之后不分片地 --resume 会重新列举整个存储桶，补上这些分片漏下的对象。
+    """
+    # 合并复用下载结束时的统计逻辑，在这里导入以避免循环引用
+    from src.utils.bucket_handler import finish_bucket, prepare_bucket
+    from src.utils.manifest import Manifest
+
+    for bucket_url in bucket_urls:
+        bucket_name, log_dir = prepare_bucket(bucket_url, args.module)
+        if log_dir is None:
+            continue
+
+        shards = {}
+        for path in glob.glob(os.path.join(log_dir, "shard-*-of-*")):
+            match = _SHARD_DIR.search(path)
+            if match is not None and os.path.exists(os.path.join(path, "manifest.db")):
+                shards[int(match.group(1)), int(match.group(2))] = path
+        counts = {count for _, count in shards}
+        if not shards:
+            logging.warning(f"No shard logs found for {bucket_url} under {log_dir}")
+            continue
+        if len(counts) > 1:
+            logging.error(f"Shard logs of {bucket_url} come from different shard counts "
+                          f"({', '.join(str(count) for count in sorted(counts))}). Remove the stale ones and retry.")
+            continue
+
+        count = counts.pop()
+        missing = [str(index) for index in range(1, count + 1) if (index, count) not in shards]
+        if missing:
+            logging.warning(f"Shards {', '.join(missing)} of {count} have no manifest for {bucket_url}; "
+                            f"the merged logs only cover the remaining shards. Run the missing shards and merge "
+                            f"again, or run once more with --resume (without --shard) after merging.")
+
+        with Manifest(os.path.join(log_dir, "manifest.db")) as manifest:
+            deleted = []
+            duplicates = 0
+            unlisted = []
+            for key in sorted(shards):
+                path = os.path.join(shards[key], "manifest.db")
+                with Manifest(path, resume=True) as shard_manifest:
+                    if shard_manifest.cursor(LISTED_PARTITION) is None:
+                        unlisted.append(str(key[0]))
+                duplicates += manifest.merge(path)
+                deleted_file = os.path.join(shards[key], "deleted.log")
+                if os.path.exists(deleted_file):
+                    deleted.append(deleted_file)
+            if deleted:
+                with open(os.path.join(log_dir, "deleted.log"), 'w') as out:
+                    for path in deleted:
+                        with open(path) as f:
+                            out.writelines(f)
+            if duplicates:
+                logging.warning(f"{duplicates} objects of {bucket_name} were recorded by more than one shard "
+                                f"and downloaded more than once.")
+            if unlisted:
+                logging.warning(f"Shards {', '.join(unlisted)} of {count} did not finish listing {bucket_url}, so "
+                                f"objects they own may be missing. Run them again with --resume and merge again, "
+                                f"or run once more with --resume (without --shard) after merging.")
+            logging.info(f"Merged {len(shards)} shards of {bucket_name} into {log_dir}")
+            finish_bucket(manifest, bucket_url, bucket_name, log_dir, args, listed=False)
+
@@ -0,0 +1,389 @@
+import hashlib
+import hmac
+import io
+import logging
+import os
+import queue
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.parse
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+import requests
+
+from src.utils.downloader import finish_download, local_path_for
+from src.utils.layout import directories
+from src.utils.manifest import DONE, FAILED
+from src.utils.retry import RETRYABLE_STATUS, RetryPolicy, retry_after_seconds
+from src.utils.stream import open_local
+from src.utils.sync import parse_last_modified
+
+MB = 1024 * 1024
+
+# 小于该大小的对象只在内存中暂存；MinIO 输出时合并成批量上传
+SMALL_OBJECT = 1 * MB
+
+# 等待写出的对象数上限，写出跟不上下载时提交的线程会阻塞
+QUEUE_SIZE = 64
+
+# zip 的时间戳从 1980-01-01 开始
+ZIP_EPOCH = 315532800
+
+
+def open_sink(args):
+    """按 --sink 创建下载内容的输出目标。"""
+    if args.sink == "fs":
+        return FileSink(args.layout)
+
+    batch_size = args.batch_size * MB
+    if args.sink == "minio":
+        return MinioSink(args.output, batch_size, RetryPolicy(args.retries, args.backoff))
+    # 续传、同步时追加到已有的归档末尾，其余情况重新创建
+    return ArchiveSink(args.sink, args.output or f"downloads.{args.sink}", batch_size, append=args.resume or args.sync)
+
+
+class FileSink:
+    """默认输出：每个对象一个文件，保存在 ./downloads/<bucket>/ 下，目录结构由 layout 决定。"""
+    # 对象落在本地文件上：可以分段下载、--dedup 建立硬链接、--sync 核对本地副本
+    local = True
+
+    def __init__(self, layout: str = "tree") -> None:
+        self.layout = layout
+
+    def path(self, bucket_name: str, key: str) -> str:
+        return local_path_for(bucket_name, key, self.layout)
+
+    def prepare(self, bucket_name: str, items) -> None:
+        """对象交给下载线程之前，按列举到的一页一次性建好目录树，下载线程写文件时不再逐个检查、创建目录。"""
+        directories.ensure_all({os.path.dirname(self.path(bucket_name, item.key)) for item in items})
+
+    def open(self, path: str, size: int = None, preallocate: bool = False):
+        return open_local(path, size, preallocate)
+
+    def commit(self, item, path: str, manifest=None, succeeded: bool = True) -> bool:
+        return finish_download(item, path, manifest, succeeded)
+
+    def flush(self, manifest) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _Spool:
+    """一个对象下载时的暂存区：不超过 SMALL_OBJECT 的留在内存，更大的溢出到临时文件；关闭后等待 commit。"""
+
+    def __init__(self, sink, path: str) -> None:
+        self.sink = sink
+        self.path = path
+        self.file = tempfile.SpooledTemporaryFile(max_size=SMALL_OBJECT)
+
+    def write(self, data) -> int:
+        return self.file.write(data)
+
+    def truncate(self, size: int) -> None:
+        self.file.truncate(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sink._stage(self.path, self.file)
+
+
+class _QueuedSink(ABC):
+    """
+    归档和 MinIO 输出的公共部分：下载写入 _Spool，commit 时核对大小后放入队列，由一个写出线程按顺序写出，
+    写出后才在清单中记为完成。对象以 <bucket>/<key> 命名，不在本地为每个对象创建目录和文件。
+    """
+    local = False
+
+    def __init__(self, target: str) -> None:
+        self.target = target
+        self.lock = threading.Lock()
+        self.staged = {}
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.written = 0
+        self.failed = 0
+        self.bytes = 0
+        self.thread = threading.Thread(target=self._run, name="sink", daemon=True)
+        self.thread.start()
+
+    def path(self, bucket_name: str, key: str) -> str:
+        return f"{bucket_name}/{key}"
+
+    def prepare(self, bucket_name: str, items) -> None:
+        pass
+
+    def open(self, path: str, size: int = None, preallocate: bool = False) -> _Spool:
+        return _Spool(self, path)
+
+    def _stage(self, path: str, file) -> None:
+        with self.lock:
+            # 重试下载时替换掉上一次没写完的暂存内容
+            previous = self.staged.pop(path, None)
+            self.staged[path] = file
+        if previous is not None:
+            previous.close()
+
+    def commit(self, item, path: str, manifest=None, succeeded: bool = True) -> bool:
+        with self.lock:
+            file = self.staged.pop(path, None)
+        if file is None or not succeeded or file.seek(0, os.SEEK_END) != item.size:
+            if file is not None:
+                file.close()
+            self._finished(item, manifest, False)
+            return False
+
+        file.seek(0)
+        self._accept(path, file, item, manifest)
+        return True
+
+    def _accept(self, path: str, file, item, manifest) -> None:
+        self.queue.put((path, file, item, manifest))
+
+    def flush(self, manifest) -> None:
+        """等待此前提交的对象全部写出，之后该清单中的状态才是最终结果。"""
+        done = threading.Event()
+        self.queue.put((None, done, None, manifest))
+        done.wait()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        self._close()
+        logging.info(f"Wrote {self.written} objects ({self.bytes / MB:.2f} MB) to {self.target}"
+                     + (f", {self.failed} failed" if self.failed else ""))
+
+    def _run(self) -> None:
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                self._flushed()
+                return
+
+            path, file, item, manifest = entry
+            if path is None:
+                self._flushed()
+                file.set()
+                continue
+            try:
+                self._write(path, file, item, manifest)
+            except Exception as e:
+                self._log_error(path, e)
+                self._finished(item, manifest, False)
+            finally:
+                file.close()
+
+    def _finished(self, item, manifest, completed: bool) -> None:
+        with self.lock:
+            if completed:
+                self.written += 1
+                self.bytes += item.size
+            else:
+                self.failed += 1
+        if manifest is not None:
+            manifest.mark(item.key, DONE if completed else FAILED)
+
+    @abstractmethod
+    def _write(self, path: str, file, item, manifest) -> None:
+        """在写出线程中写出一个对象，之后调用 _finished 记录结果。"""
+        pass
+
+    def _flushed(self) -> None:
+        """写出线程处理完 flush 之前的所有对象时调用。"""
+
+    def _close(self) -> None:
+        pass
+
+    def _log_error(self, path: str, error) -> None:
+        logging.warning(f"[Error] Writing {path} to {self.target} failed. Error: {error}")
+
+
+def _mtime(item) -> float:
+    mtime = parse_last_modified(item.last_modified)
+    return mtime if mtime is not None else time.time()
+
+
+def _tar_info(path: str, item) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(path)
+    info.size = item.size
+    info.mtime = int(_mtime(item))
+    info.mode = 0o644
+    return info
+
+
+class _WriteOnly:
+    """只提供 write/flush：zipfile 因此按不可回退的流写出（数据描述符），不会回头改写文件头，写入保持顺序。"""
+
+    def __init__(self, file) -> None:
+        self.file = file
+
+    def write(self, data) -> int:
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+class ArchiveSink(_QueuedSink):
+    """
+    把所有对象按 <bucket>/<key> 依次写入一个 tar 或 zip 文件，output 为 - 时写到标准输出。
+    输出按 batch_size 缓冲，小对象合并为大块顺序写入；append 时追加到已有归档末尾（同名条目解包时以后写入的为准）。
+    """
+
+    def __init__(self, kind: str, output: str, batch_size: int, append: bool = False) -> None:
+        if output == "-":
+            # 标准输出不能回退，tar 和 zip 都按流写出
+            self.file = io.BufferedWriter(getattr(sys.stdout.buffer, "raw", sys.stdout.buffer), buffer_size=batch_size)
+            append = False
+        else:
+            append = append and os.path.exists(output) and os.path.getsize(output) > 0
+            self.file = open(output, 'r+b' if append else 'wb', buffering=batch_size)
+
+        self.kind = kind
+        self.stdout = output == "-"
+        if kind == "tar":
+            # 缓冲由 self.file 完成；tarfile 的流模式（w|）拼接 bytes 缓冲，只用于标准输出
+            mode = 'a' if append else 'w|' if self.stdout else 'w'
+            self.archive = tarfile.open(fileobj=self.file, mode=mode, format=tarfile.PAX_FORMAT)
+            self.archive.copybufsize = SMALL_OBJECT
+        else:
+            self.archive = zipfile.ZipFile(self.file if append else _WriteOnly(self.file), 'a' if append else 'w',
+                                           zipfile.ZIP_STORED)
+        super().__init__("standard output" if self.stdout else output)
+
+    def _write(self, path: str, file, item, manifest) -> None:
+        if self.kind == "tar":
+            self.archive.addfile(_tar_info(path, item), file)
+        else:
+            info = zipfile.ZipInfo(path, time.localtime(max(_mtime(item), ZIP_EPOCH))[:6])
+            info.file_size = item.size
+            with self.archive.open(info, 'w', force_zip64=item.size >= zipfile.ZIP64_LIMIT) as dest:
+                shutil.copyfileobj(file, dest, SMALL_OBJECT)
+        self._finished(item, manifest, True)
+
+    def _close(self) -> None:
+        self.archive.close()
+        if self.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
+
+
+class MinioSink(_QueuedSink):
+    """
+    把对象上传到 MinIO 兼容的存储桶（output 如 http://127.0.0.1:9000/backup），对象键为 <bucket>/<key>。
+    大对象在下载线程中各自 PUT；小对象由写出线程合并成 tar，凑够 batch_size 后一次 PUT，
+    由 MinIO 的 snowball 自动解包（X-Amz-Meta-Snowball-Auto-Extract）为单独的对象。
+    设置了 AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY 时请求使用 SigV4 签名，否则匿名访问。
+    """
+
+    def __init__(self, output: str, batch_size: int, retry_policy: RetryPolicy) -> None:
+        self.batch_size = batch_size
+        self.retry_policy = retry_policy
+        self.access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+        self.secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        self.region = os.environ.get("AWS_REGION", "us-east-1")
+        self.session = requests.Session()
+        # 输出端点通常在本地，不经过 -p 设置的代理
+        self.session.trust_env = False
+        self.batches = 0
+        self._new_batch()
+        super().__init__(output.rstrip('/'))
+
+    def _new_batch(self) -> None:
+        self.buffer = io.BytesIO()
+        self.batch = tarfile.open(fileobj=self.buffer, mode='w', format=tarfile.PAX_FORMAT)
+        self.entries = []
+
+    def _accept(self, path: str, file, item, manifest) -> None:
+        if item.size < SMALL_OBJECT:
+            super()._accept(path, file, item, manifest)
+            return
+
+        try:
+            completed = self._put(self._url(path), file, item.size)
+        finally:
+            file.close()
+        self._finished(item, manifest, completed)
+
+    def _write(self, path: str, file, item, manifest) -> None:
+        self.batch.addfile(_tar_info(path, item), file)
+        self.entries.append((item, manifest))
+        if self.buffer.tell() >= self.batch_size:
+            self._send_batch()
+
+    def _flushed(self) -> None:
+        if self.entries:
+            self._send_batch()
+
+    def _send_batch(self) -> None:
+        self.batch.close()
+        self.batches += 1
+        url = self._url(f"snowball-{os.getpid()}-{int(time.time())}-{self.batches}.tar")
+        data = self.buffer.getvalue()
+        completed = self._put(url, data, len(data), {"X-Amz-Meta-Snowball-Auto-Extract": "true"})
+        for item, manifest in self.entries:
+            self._finished(item, manifest, completed)
+        self._new_batch()
+
+    def _url(self, path: str) -> str:
+        return f"{self.target}/{urllib.parse.quote(path, safe='/-_.~')}"
+
+    def _put(self, url: str, body, size: int, headers=None) -> bool:
+        """PUT 一个对象，限流、5xx 和网络错误按重试策略退避后重新上传。"""
+        error = None
+        for attempt in range(self.retry_policy.retries + 1):
+            retry_after = None
+            if hasattr(body, "seek"):
+                body.seek(0)
+            request_headers = dict(headers or {}, **{"Content-Length": str(size)})
+            self._sign("PUT", url, request_headers)
+            try:
+                response = self.session.put(url, data=body, headers=request_headers, timeout=60)
+            except requests.exceptions.RequestException as e:
+                error = e
+            else:
+                if response.status_code < 300:
+                    return True
+                error = response.status_code
+                if response.status_code not in RETRYABLE_STATUS:
+                    break
+                retry_after = retry_after_seconds(response.headers)
+            if attempt < self.retry_policy.retries:
+                time.sleep(self.retry_policy.delay(attempt, retry_after))
+
+        self._log_error(url, error)
+        return False
+
+    def _sign(self, method: str, url: str, headers: dict) -> None:
+        """AWS Signature Version 4，请求体不参与签名（UNSIGNED-PAYLOAD）。"""
+        if not self.access_key or not self.secret_key:
+            return
+
+        parts = urllib.parse.urlsplit(url)
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = "UNSIGNED-PAYLOAD"
+        signed = {"host": parts.netloc, "x-amz-content-sha256": "UNSIGNED-PAYLOAD", "x-amz-date": amz_date}
+        signed_headers = ";".join(sorted(signed))
+        canonical_request = "\n".join([
+            method, parts.path or "/", parts.query,
+            "".join(f"{name}:{signed[name]}\n" for name in sorted(signed)), signed_headers, "UNSIGNED-PAYLOAD"])
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode()).hexdigest()])
+
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (amz_date[:8], self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed_headers}, Signature={signature}")
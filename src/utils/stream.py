@@ -0,0 +1,119 @@
+import os
+import threading
+
+from src.utils.layout import directories
+
+# 默认读缓冲区大小，可通过 --buffer-size 调整
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+_local = threading.local()
+
+
+def _buffer(buffer_size: int) -> memoryview:
+    """每个线程复用一块 bytearray，避免每个分块都分配新的 bytes。"""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or len(buffer) != buffer_size:
+        buffer = _local.buffer = bytearray(buffer_size)
+    return memoryview(buffer)
+
+
+def _readinto(raw):
+    # 未压缩的响应直接从 http.client 的响应对象 readinto，数据只拷贝一次（内核 -> 缓冲区）；
+    # urllib3 自己的 readinto 会先 read 出 bytes 再拷贝，只在需要解码时使用
+    fp = getattr(raw, "_fp", None)
+    if fp is not None and hasattr(fp, "readinto") and \
+            raw.headers.get("Content-Encoding", "identity").lower() == "identity":
+        return fp.readinto
+    return raw.readinto
+
+
+def iter_raw(raw, buffer_size: int = DEFAULT_BUFFER_SIZE, digest=None):
+    """
+    把响应体读入线程内复用的缓冲区，逐块产出 memoryview。
+    产出的视图在下一次迭代时会被覆盖，调用方需在此之前写出。
+    传入 digest 时改为读入 digest.acquire 提供的缓冲区，哈希线程算完之前不会被覆盖。
+    """
+    view = _buffer(buffer_size) if digest is None else None
+    readinto = _readinto(raw)
+    while True:
+        buffer = view if digest is None else digest.acquire(buffer_size)
+        count = readinto(buffer)
+        if not count:
+            if digest is not None:
+                digest.release(buffer.obj)
+            break
+        yield buffer[:count]
+
+    # 绕过 urllib3 读完响应体时它不会自动归还连接，读到末尾后手动放回连接池以便复用
+    release_conn = getattr(raw, "release_conn", None)
+    if release_conn is not None:
+        release_conn()
+
+
+def write_all(f, data) -> None:
+    """无缓冲文件可能只写入一部分，循环直到写完。"""
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+
+
+def preallocate(fd, size: int) -> None:
+    os.ftruncate(fd, size)
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            # 部分文件系统不支持预分配，ftruncate 得到的稀疏文件同样可用
+            pass
+
+
+def detach_hardlink(local_path: str) -> None:
+    """--dedup 创建的硬链接与其他对象共用数据，改写前先删除这个链接，避免连带改动其他副本。"""
+    try:
+        if os.stat(local_path).st_nlink > 1:
+            os.remove(local_path)
+    except FileNotFoundError:
+        pass
+
+
+def open_local(local_path: str, size: int = None, preallocate_file: bool = False):
+    """
+    打开本地文件用于写入对象（默认的文件系统输出）：目录经共享缓存只创建一次，文件不经 Python 层缓冲，大块直接落盘；
+    preallocate_file 为真且已知大小时预先分配空间。
+    """
+    directory = os.path.dirname(local_path)
+    directories.ensure(directory)
+    detach_hardlink(local_path)
+    try:
+        f = open(local_path, 'wb', buffering=0)
+    except FileNotFoundError:
+        # 目录在运行中被删除，缓存已过期
+        directories.forget(directory)
+        directories.ensure(directory)
+        f = open(local_path, 'wb', buffering=0)
+    if preallocate_file and size:
+        preallocate(f.fileno(), size)
+    return f
+
+
+def write_stream(raw, f, size: int = None, buffer_size: int = DEFAULT_BUFFER_SIZE, transfer=None, digest=None) -> int:
+    """
+    把响应体写入 f（open_local 或输出目标打开的写入对象）并返回写入的字节数。
+    传入 transfer 时同时累加进度计数，传入 digest（checksum.Digest）时把写出的数据块交给哈希线程校验（不复制）。
+    transfer.split 被置位（拖尾对象被拆分）时在当前位置停止，剩余部分由调用方分段下载。
+    流提前结束时截断到实际长度，预分配过的文件不会留下大小“正确”的残缺内容。
+    """
+    written = 0
+    for chunk in iter_raw(raw, buffer_size, digest):
+        write_all(f, chunk)
+        written += len(chunk)
+        if transfer is not None:
+            transfer.bytes += len(chunk)
+            if transfer.split:
+                break
+        if digest is not None:
+            digest.update(chunk, recycle=True)
+
+    if size and written != size:
+        f.truncate(written)
+    return written
@@ -0,0 +1,46 @@
+import logging
+import os
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+
+def parse_last_modified(value):
+    """把各家 Last-Modified（ISO 8601、RFC 1123 或毫秒时间戳）解析为 Unix 时间戳，无法解析时返回 None。"""
+    if not value:
+        return None
+    try:
+        if value.isdigit():
+            return int(value) / 1000
+        if value[:1].isdigit():
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def local_copy_current(item, local_path: str) -> bool:
+    """本地副本存在、大小一致且不早于远端 Last-Modified 时视为最新。"""
+    try:
+        stat = os.stat(local_path)
+    except OSError:
+        return False
+
+    if stat.st_size != item.size:
+        return False
+    remote_mtime = parse_last_modified(item.last_modified)
+    return remote_mtime is None or stat.st_mtime >= remote_mtime
+
+
+def report_deletions(manifest, bucket_url: str, log_dir: str) -> int:
+    """把远端已删除（本次同步没有列举到）的对象写入 deleted.log，返回数量。"""
+    deleted_file = os.path.join(log_dir, "deleted.log")
+    count = 0
+    with open(deleted_file, 'w') as f:
+        for keys in manifest.deleted_objects():
+            for item in keys:
+                f.write(f"{bucket_url}/{item.key}\n")
+            count += len(keys)
+
+    if count:
+        logging.info(f"Deleted since last sync: {count} files, written to {deleted_file}")
+    return count
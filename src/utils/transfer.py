@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.checksum import expected_checksum, file_checksum
+from src.utils.layout import ensure_parent
+from src.utils.stream import detach_hardlink, iter_raw, preallocate
+
+# 拆分拖尾对象时每个分段的最小字节数
+MIN_SPLIT_PART = 1024 * 1024
+
+
+class RangedDownloader:
+    """
+    大对象分段下载：超过阈值的对象按 part_size 切成多个 Range 请求，在独立的线程池里并行获取，
+    按偏移量写入预先分配好大小的文件。每个分段请求只发一次，只重试失败的分段（每轮之间按重试策略退避），
+    全部完成后再核对字节数与列举大小。
+    服务端不支持 Range（返回 200）时回退为普通的单连接下载。所有存储桶共用一个分段线程池。
+    """
+
+    def __init__(self, threshold: int, part_size: int, workers: int, retries: int = 3) -> None:
+        self.threshold = threshold
+        self.part_size = part_size
+        self.workers = workers
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="part")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(wait=True)
+
+    def accepts(self, size: int) -> bool:
+        return 0 < self.threshold <= size and 0 < self.part_size < size
+
+    def download_object(self, bucket_handler, key: str, local_path: str, size: int, transfer=None) -> None:
+        ensure_parent(local_path)
+        detach_hardlink(local_path)
+        self._download_parts(bucket_handler, key, local_path, size, 0, self.part_size, transfer)
+
+    def download_remainder(self, bucket_handler, key: str, local_path: str, size: int, offset: int,
+                           transfer=None) -> None:
+        """
+        单流下载被判定为拖尾（见 BucketScheduler）并在 offset 处中止后，把剩余的 [offset, size) 平分给分段线程池，
+        接在已写入的前缀之后按偏移量写入，完成后同样读回整个文件校验。
+        """
+        part_size = max(-(-(size - offset) // self.workers), MIN_SPLIT_PART)
+        self._download_parts(bucket_handler, key, local_path, size, offset, part_size, transfer)
+
+    def _download_parts(self, bucket_handler, key: str, local_path: str, size: int, offset: int, part_size: int,
+                        transfer=None) -> None:
+        file_url = bucket_handler.object_url(key)
+        parts = [(start, min(start + part_size, size) - 1) for start in range(offset, size, part_size)]
+        ranges_supported = True
+        fd = os.open(local_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            preallocate(fd, size)
+            writer = _PositionalWriter(fd, offset)
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(bucket_handler.retry_policy.delay(attempt - 1))
+                results = list(self.executor.map(
+                    lambda part: self._fetch_part(bucket_handler, file_url, writer, part, transfer), parts))
+                if None in results:
+                    # 服务端忽略了 Range 头
+                    ranges_supported = False
+                    break
+                parts = [part for part, ok in zip(parts, results) if not ok]
+                if not parts:
+                    break
+
+            completed = ranges_supported and not parts and writer.written == size and os.fstat(fd).st_size == size
+        finally:
+            os.close(fd)
+
+        # 分段乱序写入，无法边写边算；整个对象的 MD5 / CRC64 在写完后读回文件校验，
+        # 不一致时改为单个流式请求重新下载（边写边校验，按重试策略重试）
+        expected = expected_checksum(writer.headers) if completed and writer.headers is not None else None
+        mismatched = expected is not None and \
+            file_checksum(local_path, expected[0], bucket_handler.buffer_size) != expected[1]
+        if completed and not mismatched:
+            return
+
+        # 分段失败时删除预分配的文件，避免留下大小“正确”的残缺文件；重新下载时不再拆分
+        os.remove(local_path)
+        if transfer is not None:
+            transfer.split = False
+        if mismatched:
+            logging.debug(f"{expected[0]} checksum mismatch after ranged download of {file_url}, downloading again")
+            bucket_handler.download_object(key, local_path, size, transfer)
+        elif not ranges_supported:
+            bucket_handler.download_object(key, local_path, size, transfer)
+        else:
+            bucket_handler._log_error("Download object", file_url, f"{len(parts)} byte ranges failed")
+
+    def _fetch_part(self, bucket_handler, file_url, writer, part, transfer=None):
+        """下载一个分段，成功返回 True，失败返回 False，服务端不支持 Range 时返回 None。"""
+        start, end = part
+        headers = dict(bucket_handler._request_headers() or {})
+        headers["Range"] = f"bytes={start}-{end}"
+        try:
+            with bucket_handler._trace("range") as trace, \
+                    bucket_handler._get_once(file_url, trace, headers=headers, stream=True, timeout=10) as response:
+                if response.status_code == 200:
+                    return None
+                if response.status_code != 206:
+                    logging.debug(f"Range {start}-{end} of {file_url} failed with status {response.status_code}")
+                    return False
+                if writer.headers is None:
+                    writer.headers = response.headers
+
+                offset = start
+                for chunk in iter_raw(response.raw, bucket_handler.buffer_size):
+                    if offset + len(chunk) > end + 1:
+                        return False
+                    writer.write_at(chunk, offset)
+                    offset += len(chunk)
+                    if transfer is not None:
+                        # 同一对象的各分段在不同线程中累加
+                        transfer.add(len(chunk))
+                trace.read(offset - start)
+        except Exception as e:
+            logging.debug(f"Range {start}-{end} of {file_url} failed: {e}")
+            return False
+
+        if offset != end + 1:
+            return False
+        writer.add_written(end + 1 - start)
+        return True
+
+
+class _PositionalWriter:
+    """按偏移量写文件：有 os.pwrite 时直接定位写入，否则加锁后 seek + write。"""
+
+    def __init__(self, fd, written: int = 0) -> None:
+        self.fd = fd
+        self.lock = threading.Lock()
+        self.written = written
+        # 第一个分段的响应头，其中的 ETag、CRC64 描述整个对象
+        self.headers = None
+
+    def write_at(self, data, offset: int) -> None:
+        if hasattr(os, "pwrite"):
+            view = memoryview(data)
+            while view:
+                count = os.pwrite(self.fd, view, offset)
+                view = view[count:]
+                offset += count
+            return
+
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+
+    def add_written(self, count: int) -> None:
+        with self.lock:
+            self.written += count
+
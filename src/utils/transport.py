@@ -0,0 +1,144 @@
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+from src.utils.metrics import note_connect
+
+# 同时保留连接池的主机数（按 scheme/host/port 区分），URL 文件中相同端点的存储桶可以复用热连接
+POOL_HOSTS = 16
+
+
+class PoolStats:
+    """连接池计数：请求取出连接的次数、新建的 TCP/TLS 连接数，以及池满被丢弃的连接数。"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.discarded = 0
+
+    def add(self, field: str) -> None:
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+    def summary(self) -> str:
+        hit_rate = self.reused / self.requests * 100 if self.requests else 0
+        return (f"Connection pool: {self.requests} requests, {self.connections} new connections, "
+                f"{self.reused} reused ({hit_rate:.1f}% hits), {self.discarded} discarded")
+
+
+def _counting_pool_classes(stats: PoolStats) -> dict:
+    class TimedConnectMixin:
+        """统计新建连接数，并把 DNS 解析、TCP 握手与 TLS 握手的耗时交给当前线程的请求计时。"""
+        dns_time = tcp_time = 0.0
+
+        def _new_conn(self):
+            # 先自己解析主机名以单独计时，再按解析出的地址逐个连接（地址已是 IP，urllib3 不会再解析一次）
+            started = time.perf_counter()
+            host = self._dns_host
+            try:
+                addresses = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            except socket.gaierror:
+                # 解析失败时由 urllib3 再解析一次并抛出 NameResolutionError
+                return super()._new_conn()
+            resolved = time.perf_counter()
+            self.dns_time = resolved - started
+            try:
+                for i, address in enumerate(addresses):
+                    self._dns_host = address[4][0]
+                    try:
+                        sock = super()._new_conn()
+                        break
+                    except ConnectTimeoutError:
+                        # 连接失败和超时（NewConnectionError 是它的子类），换下一个地址
+                        if i == len(addresses) - 1:
+                            raise
+            finally:
+                # TLS 的 SNI 和证书校验使用原来的主机名
+                self._dns_host = host
+            self.tcp_time = time.perf_counter() - resolved
+            return sock
+
+        def connect(self):
+            stats.add("connections")
+            started = time.perf_counter()
+            super().connect()
+            note_connect(self.dns_time, self.tcp_time, time.perf_counter() - started - self.dns_time - self.tcp_time)
+
+    class CountingHTTPConnection(TimedConnectMixin, HTTPConnection):
+        pass
+
+    class CountingHTTPSConnection(TimedConnectMixin, HTTPSConnection):
+        pass
+
+    class CountingPoolMixin:
+        def _get_conn(self, timeout=None):
+            stats.add("requests")
+            return super()._get_conn(timeout)
+
+        def _put_conn(self, conn):
+            if conn is not None and self.pool is not None and self.pool.full():
+                stats.add("discarded")
+            super()._put_conn(conn)
+
+    class CountingHTTPConnectionPool(CountingPoolMixin, HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSConnectionPool(CountingPoolMixin, HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """按并发线程数设定每个主机的连接池大小，并统计连接复用情况的 HTTPAdapter。"""
+
+    def __init__(self, stats: PoolStats, **kwargs) -> None:
+        self.stats = stats
+        self.pool_classes = _counting_pool_classes(stats)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS 代理使用自己的连接类，只对 HTTP 代理计数
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = self.pool_classes
+        return manager
+
+
+def build_session(args) -> requests.Session:
+    """创建共享的 requests.Session：连接池大小覆盖所有会并发发请求的线程，并设置代理。"""
+    session = requests.Session()
+    if args.proxy:
+        session.proxies = {
+            'http': args.proxy,
+            'https': args.proxy,
+            'socks5': args.proxy
+        }
+        session.trust_env = False  # 忽略系统代理设置
+    session.verify = False
+
+    # 下载线程、分段下载线程和列举线程都会同时使用同一个主机的连接池
+    pool_size = args.threads + args.part_workers + args.list_workers
+    session.pool_stats = PoolStats()
+    # 同时处理多个存储桶时，每个虚拟主机风格的存储桶都是一个独立主机
+    pool_hosts = max(POOL_HOSTS, args.bucket_workers * 2)
+    adapter = PooledHTTPAdapter(session.pool_stats, pool_connections=pool_hosts, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
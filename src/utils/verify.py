@@ -0,0 +1,108 @@
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from src.handlers import BucketFactory
+from src.utils.bucket_handler import prepare_bucket, progress_desc
+from src.utils.checksum import available, expected_checksum, file_checksum, file_checksums
+from src.utils.downloader import local_path_for
+from src.utils.manifest import FAILED, Manifest
+from src.utils.progress import Progress
+from src.utils.retry import RetryPolicy
+from src.utils.scheduler import endpoint_of
+
+# 核对结果
+VERIFIED = "verified"
+MISMATCH = "mismatch"
+MISSING = "missing"
+UNVERIFIED = "unverified"  # 大小一致，但服务端没有提供可用的校验和
+
+
+def verify_buckets(bucket_urls, session, args, metrics=None) -> None:
+    """
+    --verify：不重新下载，用 -t 个线程并行核对清单中已下载完成的本地文件。
+    ETag 是内容 MD5 时直接比较；否则（分片上传、Azure 等）发一个 HEAD 取得 Content-MD5 或 CRC64。
+    每个文件只读一遍，进度也只累加一次。
+    缺失、大小或校验和不一致的对象在清单中改记为失败，之后用 --resume 重新下载。
+    """
+    retry_policy = RetryPolicy(args.retries, args.backoff)
+    with Progress(progress_desc(bucket_urls, "Verifying")) as progress, \
+            ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix="verify") as executor:
+        for bucket_url in bucket_urls:
+            _verify_bucket(bucket_url, session, args, metrics, retry_policy, progress, executor)
+
+
+def _verify_bucket(bucket_url, session, args, metrics, retry_policy, progress, executor) -> None:
+    bucket_name, log_dir = prepare_bucket(bucket_url, args.module, args.shard)
+    if log_dir is None:
+        return
+    manifest_path = os.path.join(log_dir, "manifest.db")
+    if not os.path.exists(manifest_path):
+        logging.warning(f"No manifest for {bucket_url}. Download the bucket before running --verify.")
+        return
+
+    bucket_handler = BucketFactory.get_handler(bucket_url, session, args.module)
+    bucket_handler.set_retry_options(retry_policy)
+    bucket_handler.set_metrics(metrics, bucket_name, endpoint_of(bucket_url, bucket_name))
+    buffer_size = args.buffer_size * 1024
+
+    def check(item):
+        transfer = progress.start(bucket_name, item.size)
+        try:
+            return _verify_object(bucket_handler, item, local_path_for(bucket_name, item.key, args.layout),
+                                  buffer_size, transfer)
+        finally:
+            progress.finish(transfer)
+
+    results = Counter()
+    # 以续传方式打开，保留已有的清单
+    with Manifest(manifest_path, resume=True) as manifest:
+        for keys in manifest.done_objects():
+            progress.grow(bucket_name, sum(item.size for item in keys), len(keys))
+            for item, result in zip(keys, executor.map(check, keys)):
+                results[result] += 1
+                if result in (MISMATCH, MISSING):
+                    logging.warning(f"[Verify] {result}: {bucket_url}/{item.key}")
+                    manifest.mark(item.key, FAILED)
+    progress.finish_bucket(bucket_name)
+
+    logging.info(f"Verified {bucket_name}: {results[VERIFIED]} ok, {results[MISMATCH]} mismatched, "
+                 f"{results[MISSING]} missing, {results[UNVERIFIED]} without a checksum (size only)")
+    if results[MISMATCH] or results[MISSING]:
+        logging.warning(f"{results[MISMATCH] + results[MISSING]} files of {bucket_name} failed verification. "
+                        f"Run again with --resume to download them again.")
+
+
+def _verify_object(bucket_handler, item, local_path: str, buffer_size: int, transfer) -> str:
+    try:
+        size = os.path.getsize(local_path)
+    except OSError:
+        return MISSING
+    if size != item.size:
+        return MISMATCH
+
+    expected = expected_checksum({}, item.etag)
+    checksums = {}
+    if expected is not None:
+        # 服务端还提供 CRC64 时在同一遍读取中一并计算，ETag 其实不是 MD5（加密对象）时不必再读一遍
+        algorithms = ["md5"]
+        if bucket_handler.crc64_header and available("crc64"):
+            algorithms.append("crc64")
+        checksums = file_checksums(local_path, algorithms, buffer_size, transfer)
+        if checksums["md5"] == expected[1]:
+            return VERIFIED
+
+    # ETag 不是内容 MD5（分片上传、Azure），或者是加密对象的 ETag：以 HEAD 返回的响应头为准
+    headers = bucket_handler.head_object(item.key)
+    current = expected_checksum(headers) if headers is not None else None
+    if current is None:
+        # HEAD 失败时无法排除不一致，保守地记为不一致；服务端没有校验和时只能核对大小
+        return MISMATCH if expected is not None and headers is None else UNVERIFIED
+    if current == expected:
+        return MISMATCH
+    actual = checksums.get(current[0])
+    if actual is None:
+        # 已读过一遍时不再累加进度
+        actual = file_checksum(local_path, current[0], buffer_size, None if checksums else transfer)
+    return VERIFIED if actual == current[1] else MISMATCH